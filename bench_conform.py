@@ -0,0 +1,78 @@
+# bench_conform.py
+"""Micro-benchmark: kg_conform.conform vs the previous recursive conform.
+
+    python bench_conform.py [num_entities] [repeat]
+"""
+import copy
+import json
+import sys
+import timeit
+
+from kg_conform import KGSchema, conform
+
+ENTITIES = [
+    {"label": label, "properties": [{"name": "name", "type": "STRING"}]}
+    for label in ("Executive", "Product", "FinancialMetric", "RiskFactor",
+                  "StockType", "Transaction", "TimePeriod", "Company")
+]
+RELATIONS = [{"label": label} for label in ("HAS_METRIC", "FACES_RISK", "ISSUED_STOCK", "MENTIONS")]
+
+
+def legacy_conform(obj):
+    # The recursive implementation previously in my_real_pdf_loader.py
+    if isinstance(obj, dict):
+        new_obj = {}
+        for k, v in obj.items():
+            if k == "properties" and v == []:
+                new_obj[k] = {}
+            else:
+                new_obj[k] = legacy_conform(v)
+        if set(new_obj.keys()) & {"entities", "relations"}:
+            allowed_keys = {"entities", "relations"}
+            new_obj = {k: v for k, v in new_obj.items() if k in allowed_keys}
+            if "entities" not in new_obj or not isinstance(new_obj["entities"], list):
+                new_obj["entities"] = []
+            if "relations" not in new_obj or not isinstance(new_obj["relations"], list):
+                new_obj["relations"] = []
+        return new_obj
+    elif isinstance(obj, list):
+        return [legacy_conform(item) for item in obj]
+    else:
+        return obj
+
+
+def make_output(n):
+    labels = [e["label"] for e in ENTITIES]
+    types = [r["label"] for r in RELATIONS]
+    entities = [
+        {"id": str(i), "label": labels[i % len(labels)],
+         "properties": {"name": f"entity {i}"} if i % 3 else []}
+        for i in range(n)
+    ]
+    relations = [
+        {"type": types[i % len(types)], "start_node_id": str(i), "end_node_id": str((i * 7 + 1) % n),
+         "properties": []}
+        for i in range(n * 2)
+    ]
+    return json.dumps({"entities": entities, "relations": relations})
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    content = make_output(n)
+    schema = KGSchema(ENTITIES, RELATIONS)
+    parsed = json.loads(content)
+    print(f"{n} entities, {2 * n} relations, {len(content) / 1e6:.1f} MB of JSON, best of {repeat}")
+
+    # Both variants get a fresh copy; conform mutates its input in place
+    copies = [copy.deepcopy(parsed) for _ in range(repeat)]
+    legacy = min(timeit.repeat(lambda: legacy_conform(copies[0]), number=1, repeat=repeat))
+    it = iter(copies)
+    current = min(timeit.repeat(lambda: conform(next(it), schema), number=1, repeat=repeat))
+    print(f"legacy recursive conform: {legacy * 1000:8.2f} ms")
+    print(f"kg_conform.conform:       {current * 1000:8.2f} ms  ({legacy / current:.1f}x, includes validation)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# chat_render.py
+import json
+import re
+import threading
+from collections import OrderedDict
+
+RENDER_CACHE_ENTRIES = 2000
+COLLAPSE_MIN_CHARS = 400  # shorter tool output is shown inline
+
+_TOOL_RESULT_RE = re.compile(r"^([✅❌]) `([^`]+)` (result|job \w+)")
+
+# Shared by every Streamlit session in the process, each running on its own thread
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class RenderedMessage:
+    """What the chat needs to draw one message: a one-line summary when collapsible, and the body."""
+
+    __slots__ = ("role", "summary", "body")
+
+    def __init__(self, role, summary, body):
+        self.role = role
+        self.summary = summary
+        self.body = body
+
+
+def _size(text):
+    return f"{len(text) / 1024:.1f} KB" if len(text) >= 1024 else f"{len(text)} chars"
+
+
+def _prepare(message):
+    role, content = message.get("role"), message.get("content") or ""
+    match = _TOOL_RESULT_RE.match(content)
+    if match and len(content) >= COLLAPSE_MIN_CHARS:
+        icon, tool, kind = match.groups()
+        return RenderedMessage(role, f"{icon} `{tool}` {kind} ({_size(content)})", content)
+    if role == "user" and content.startswith('{"tool_call"'):
+        # Per-file tool calls queued after listDir
+        try:
+            call = json.loads(content)["tool_call"]
+            args = call.get("arguments", {})
+            target = args.get("path") or next(iter(args.values()), "")
+            return RenderedMessage(role, f"🔧 `{call.get('name')}` {target}", f"```json\n{content}\n```")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            pass
+    return RenderedMessage(role, None, content)
+
+
+def prepare_message(conversation_id, message):
+    """Cached RenderedMessage for a stored message.
+
+    Stored messages never change except through compaction, which shortens
+    them, so (conversation, seq, length) identifies what was rendered.
+    """
+    key = (conversation_id, message.get("seq"), len(message.get("content") or ""))
+    with _cache_lock:
+        rendered = _cache.get(key)
+        if rendered is not None:
+            _cache.move_to_end(key)
+            return rendered
+    rendered = _prepare(message)
+    with _cache_lock:
+        _cache[key] = rendered
+        while len(_cache) > RENDER_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return rendered
@@ -0,0 +1,94 @@
+# chunking.py
+import os
+import re
+
+from neo4j_graphrag.experimental.components.text_splitters.base import TextSplitter
+from neo4j_graphrag.experimental.components.text_splitters.fixed_size_splitter import FixedSizeSplitter
+from neo4j_graphrag.experimental.components.types import TextChunk, TextChunks
+
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "section")  # "section" or "fixed"
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "4000"))              # characters
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+
+# 10-K/10-Q item headings on their own line, e.g. "Item 1A. Risk Factors", "ITEM 7 - Management's Discussion"
+SECTION_HEADING_RE = re.compile(r"^[ \t]*(ITEM[ \t]+\d{1,2}[A-C]?)[ \t]*[.:\-–—][ \t]*(.{0,100})$",
+                                re.IGNORECASE | re.MULTILINE)
+# A heading followed by less text than this before the next heading is a table-of-contents
+# line ("Item 1A. Risk Factors    12"), not the start of a section
+MIN_SECTION_BODY = 300
+
+
+def _windows(text, size, overlap):
+    """Fixed-size windows that end on whitespace where possible, so words are not cut in half."""
+    start, n = 0, len(text)
+    while start < n:
+        end = min(start + size, n)
+        if end < n:
+            cut = text.rfind(" ", start + size // 2, end)
+            if cut != -1:
+                end = cut
+        yield text[start:end]
+        if end >= n:
+            break
+        start = max(end - overlap, start + 1)
+
+
+def _section_headings(text):
+    found = list(SECTION_HEADING_RE.finditer(text))
+    return [
+        match for i, match in enumerate(found)
+        if i + 1 == len(found) or found[i + 1].start() - match.end() >= MIN_SECTION_BODY
+    ]
+
+
+def split_sections(text):
+    """``[(heading, body), ...]``; text before the first heading gets heading None.
+
+    Table-of-contents entries stay in the preceding section rather than becoming tiny sections.
+    """
+    matches = _section_headings(text)
+    if not matches:
+        return [(None, text)]
+    sections = []
+    if matches[0].start() > 0:
+        sections.append((None, text[:matches[0].start()]))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        heading = " ".join(f"{match.group(1).title()}. {match.group(2)}".split())
+        sections.append((heading, text[match.start():end]))
+    return sections
+
+
+class SectionAwareSplitter(TextSplitter):
+    """Splits on filing item headings first, then into overlapping windows within each section.
+
+    Chunks never straddle two items, so a Risk Factors chunk does not drag in
+    the start of Properties, and each chunk carries its section in metadata.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        super().__init__()
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split(self, text):
+        chunks = []
+        for heading, body in split_sections(text):
+            for window in _windows(body, self.chunk_size, self.chunk_overlap):
+                if not window.strip():
+                    continue
+                chunks.append(TextChunk(text=window, index=len(chunks), metadata={"section": heading}))
+        return chunks
+
+    async def run(self, text: str) -> TextChunks:
+        return TextChunks(chunks=self.split(text))
+
+
+def make_text_splitter(strategy=CHUNKING_STRATEGY, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    if strategy == "section":
+        return SectionAwareSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if strategy == "fixed":
+        return FixedSizeSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    raise ValueError(f"Unknown chunking strategy: {strategy!r} (expected 'section' or 'fixed')")
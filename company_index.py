@@ -0,0 +1,129 @@
+# company_index.py
+import re
+from collections import defaultdict
+
+LEGAL_SUFFIXES = {
+    "INC", "INCORPORATED", "CORP", "CORPORATION", "CO", "COMPANY", "LTD", "LIMITED",
+    "LLC", "LP", "LLP", "PLC", "SA", "AG", "NV", "SE", "HOLDINGS", "GROUP"
+}
+FUZZY_THRESHOLD = 0.6
+
+_PUNCT_RE = re.compile(r"[^A-Z0-9 ]+")
+
+
+def _tokens(text):
+    return _PUNCT_RE.sub(" ", text.upper().replace("&", " AND ")).split()
+
+
+def normalize(name):
+    """'Apple Inc.', 'APPLE INC' and 'Apple' all normalize to 'APPLE'."""
+    tokens = _tokens(name)
+    if tokens and tokens[0] == "THE":
+        tokens = tokens[1:]
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CompanyIndex:
+    """Normalized-key and trigram index over an allow-list of company names."""
+
+    def __init__(self, names, threshold=FUZZY_THRESHOLD):
+        self.threshold = threshold
+        self._canonical = {}            # normalized key -> canonical name
+        self._trigrams = {}             # normalized key -> trigram set
+        self._postings = defaultdict(set)  # trigram -> keys containing it
+        self._longest = 0                  # tokens in the longest key
+        for name in names:
+            key = normalize(name)
+            if not key or key in self._canonical:
+                continue
+            self._canonical[key] = name
+            self._longest = max(self._longest, len(key.split()))
+            grams = trigrams(key)
+            self._trigrams[key] = grams
+            for gram in grams:
+                self._postings[gram].add(key)
+
+    def __len__(self):
+        return len(self._canonical)
+
+    def resolve(self, name):
+        """Canonical allow-list name for ``name``, or None if nothing is close enough."""
+        key = normalize(name or "")
+        if not key:
+            return None
+        if key in self._canonical:
+            return self._canonical[key]
+        grams = trigrams(key)
+        overlap = defaultdict(int)
+        for gram in grams:
+            for candidate in self._postings.get(gram, ()):
+                overlap[candidate] += 1
+        best_key, best_score = None, 0.0
+        for candidate, shared in overlap.items():
+            score = shared / (len(grams) + len(self._trigrams[candidate]) - shared)  # Jaccard
+            if score > best_score:
+                best_key, best_score = candidate, score
+        if best_score >= self.threshold:
+            return self._canonical[best_key]
+        return None
+
+    def prescan(self, text):
+        """Allow-list names whose normalized key occurs in ``text`` as a contiguous phrase.
+
+        One pass collects every phrase of the document up to the longest key's
+        length; each name then costs one set lookup, so this is cheap enough to
+        run before every extraction.
+        """
+        tokens = _tokens(text)
+        phrases = {
+            " ".join(tokens[i:i + n])
+            for n in range(1, self._longest + 1)
+            for i in range(len(tokens) - n + 1)
+        }
+        return sorted(canonical for key, canonical in self._canonical.items() if key in phrases)
+
+
+def _entity_name(entity):
+    props = entity.get("properties")
+    if isinstance(props, dict) and "name" in props:
+        return props["name"]
+    return entity.get("name")
+
+
+def _set_entity_name(entity, name):
+    if isinstance(entity.get("properties"), dict) and "name" in entity["properties"]:
+        entity["properties"]["name"] = name
+    else:
+        entity["name"] = name
+
+
+def canonicalize_companies(parsed, index):
+    """Canonicalize Company entities against the index, dropping unknown companies and their relations."""
+    if not parsed or not len(index):
+        return parsed
+    kept, dropped_ids = [], set()
+    for entity in parsed.get("entities", []):
+        if isinstance(entity, dict) and entity.get("label") == "Company":
+            canonical = index.resolve(_entity_name(entity))
+            if canonical is None:
+                if entity.get("id") is not None:
+                    dropped_ids.add(entity["id"])
+                continue
+            _set_entity_name(entity, canonical)
+        kept.append(entity)
+    parsed["entities"] = kept
+    if dropped_ids:
+        parsed["relations"] = [
+            rel for rel in parsed.get("relations", [])
+            if not (isinstance(rel, dict) and (
+                rel.get("start_node_id") in dropped_ids or rel.get("end_node_id") in dropped_ids
+            ))
+        ]
+    return parsed
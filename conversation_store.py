@@ -0,0 +1,190 @@
+# conversation_store.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "conversations.sqlite3")
+COMPACT_KEEP_RECENT = 100     # newest messages per conversation never compacted
+COMPACT_MAX_CHARS = 2000      # older messages longer than this keep only a preview
+
+
+class ConversationStore:
+    """Append-only chat message log in SQLite, shared by every UI replica using the same file.
+
+    Messages are numbered per conversation (``seq``) and read back in pages, so
+    loading a conversation costs the page size rather than its full length.
+    ``compact`` is the only rewrite: it trims the content of old, large messages.
+    """
+
+    def __init__(self, path=CONVERSATION_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                conversation_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                meta TEXT,
+                compacted INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (conversation_id, seq)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                conversation_id TEXT PRIMARY KEY,
+                tenant TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversation_jobs (
+                conversation_id TEXT NOT NULL,
+                job_id TEXT NOT NULL,
+                tool TEXT NOT NULL,
+                reported INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (conversation_id, job_id)
+            )
+        """)
+
+    def _execute(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args)
+
+    @staticmethod
+    def new_conversation_id():
+        return uuid.uuid4().hex
+
+    def bind_tenant(self, conversation_id, tenant_id):
+        """The tenant owning the conversation; the first tenant to open it becomes the owner."""
+        self._execute(
+            "INSERT OR IGNORE INTO conversations (conversation_id, tenant, created_at) VALUES (?, ?, ?)",
+            (conversation_id, tenant_id, time.time())
+        )
+        return self._execute(
+            "SELECT tenant FROM conversations WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()["tenant"]
+
+    def append(self, conversation_id, message):
+        """Append a message dict (role, content, any extra keys kept as meta); returns its seq."""
+        meta = {k: v for k, v in message.items() if k not in ("role", "content")}
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two replicas cannot pick the same seq
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) + 1 AS seq FROM messages WHERE conversation_id = ?",
+                    (conversation_id,)
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT INTO messages (conversation_id, seq, role, content, meta, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (conversation_id, row["seq"], message["role"], message["content"],
+                     json.dumps(meta) if meta else None, time.time())
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row["seq"]
+
+    def extend(self, conversation_id, messages):
+        return [self.append(conversation_id, message) for message in messages]
+
+    @staticmethod
+    def _to_message(row):
+        message = {"role": row["role"], "content": row["content"], "seq": row["seq"]}
+        if row["meta"]:
+            message.update(json.loads(row["meta"]))
+        return message
+
+    def page(self, conversation_id, before_seq=None, limit=50):
+        """Up to ``limit`` messages older than ``before_seq`` (newest page by default), oldest first."""
+        if before_seq is None:
+            rows = self._execute(
+                "SELECT * FROM messages WHERE conversation_id = ? ORDER BY seq DESC LIMIT ?",
+                (conversation_id, limit)
+            ).fetchall()
+        else:
+            rows = self._execute(
+                "SELECT * FROM messages WHERE conversation_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                (conversation_id, before_seq, limit)
+            ).fetchall()
+        return [self._to_message(row) for row in reversed(rows)]
+
+    def since(self, conversation_id, after_seq):
+        """Messages appended after ``after_seq``, oldest first."""
+        rows = self._execute(
+            "SELECT * FROM messages WHERE conversation_id = ? AND seq > ? ORDER BY seq",
+            (conversation_id, after_seq)
+        ).fetchall()
+        return [self._to_message(row) for row in rows]
+
+    def recent(self, conversation_id, limit):
+        """The last ``limit`` messages as plain role/content dicts, ready to send to the model."""
+        return [
+            {k: v for k, v in message.items() if k != "seq"}
+            for message in self.page(conversation_id, limit=limit)
+        ]
+
+    def count(self, conversation_id):
+        row = self._execute(
+            "SELECT COUNT(*) AS n FROM messages WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return row["n"]
+
+    def compact(self, conversation_id, keep_recent=COMPACT_KEEP_RECENT, max_chars=COMPACT_MAX_CHARS):
+        """Trim old, large messages (typically tool result dumps) to a preview; returns rows compacted."""
+        row = self._execute(
+            "SELECT COALESCE(MAX(seq), 0) AS seq FROM messages WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        cutoff = row["seq"] - keep_recent
+        if cutoff <= 0:
+            return 0
+        return self._execute(
+            "UPDATE messages SET compacted = 1, "
+            "content = substr(content, 1, ?) || '\n\n…[compacted: ' || (length(content) - ?) || ' more chars]' "
+            "WHERE conversation_id = ? AND seq <= ? AND compacted = 0 AND length(content) > ?",
+            (max_chars, max_chars, conversation_id, cutoff, max_chars)
+        ).rowcount
+
+    # --- Background jobs started from a conversation ---
+    def add_job(self, conversation_id, job_id, tool):
+        self._execute(
+            "INSERT OR IGNORE INTO conversation_jobs (conversation_id, job_id, tool) VALUES (?, ?, ?)",
+            (conversation_id, job_id, tool)
+        )
+
+    def pending_jobs(self, conversation_id):
+        rows = self._execute(
+            "SELECT job_id, tool FROM conversation_jobs WHERE conversation_id = ? AND reported = 0 ORDER BY rowid",
+            (conversation_id,)
+        ).fetchall()
+        return [{"id": row["job_id"], "tool": row["tool"]} for row in rows]
+
+    def mark_job_reported(self, conversation_id, job_id):
+        """True for exactly one caller, so only one replica posts a finished job into the chat."""
+        return self._execute(
+            "UPDATE conversation_jobs SET reported = 1 WHERE conversation_id = ? AND job_id = ? AND reported = 0",
+            (conversation_id, job_id)
+        ).rowcount == 1
+
+    def close(self):
+        self._conn.close()
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = ConversationStore()
+    return _store
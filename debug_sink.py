@@ -0,0 +1,117 @@
+# debug_sink.py
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from collections import deque
+
+DEBUG_LOG_FILE = os.getenv("DEBUG_LOG_FILE", "debug_log.jsonl")
+DEBUG_SAMPLE_RATE = float(os.getenv("DEBUG_SAMPLE_RATE", "1.0"))
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+MAX_STRING = 2000  # characters kept per string value
+MAX_ITEMS = 50     # items kept per list/dict
+MAX_DEPTH = 8
+
+
+def truncate(value, max_string=MAX_STRING, max_items=MAX_ITEMS, depth=MAX_DEPTH):
+    """Bounded copy of a JSON-like value; only the kept part of large payloads is ever touched."""
+    if isinstance(value, str):
+        if len(value) > max_string:
+            return value[:max_string] + f"…[+{len(value) - max_string} chars]"
+        return value
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    if depth <= 0:
+        return f"[{type(value).__name__} truncated]"
+    if isinstance(value, dict):
+        out = {}
+        for i, (k, v) in enumerate(value.items()):
+            if i >= max_items:
+                out["…"] = f"+{len(value) - max_items} keys"
+                break
+            out[str(k)] = truncate(v, max_string, max_items, depth - 1)
+        return out
+    if isinstance(value, (list, tuple)):
+        out = [truncate(v, max_string, max_items, depth - 1) for v in value[:max_items]]
+        if len(value) > max_items:
+            out.append(f"…[+{len(value) - max_items} items]")
+        return out
+    return truncate(str(value), max_string, max_items, depth)
+
+
+class _JSONLineFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, default=str)
+
+
+class _PassThroughQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # The stock handler formats msg to a string here; keep the dict for the JSON formatter
+        return record
+
+
+class DebugSink:
+    """Writes truncated, sampled debug records to a rotating JSONL file.
+
+    ``record`` only truncates and enqueues; serialization and file I/O happen
+    on the QueueListener thread, so debugging does not add to request latency.
+    """
+
+    def __init__(self, path=DEBUG_LOG_FILE, sample_rate=DEBUG_SAMPLE_RATE):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._queue = queue.SimpleQueue()
+        file_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8"
+        )
+        file_handler.setFormatter(_JSONLineFormatter())
+        self._listener = logging.handlers.QueueListener(self._queue, file_handler)
+        self._listener.start()
+        self._logger = logging.getLogger(f"debug_sink.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.DEBUG)
+        self._logger.addHandler(_PassThroughQueueHandler(self._queue))
+
+    def record(self, kind, data=None, level="debug", **fields):
+        # Errors are always kept; everything else is sampled
+        if level != "error" and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        entry = {"ts": time.time(), "kind": kind, "level": level, **truncate(fields)}
+        if data is not None:
+            entry["data"] = truncate(data)
+        self._logger.debug(entry)
+
+    def read_recent(self, limit=50, kind=None):
+        """Most recent records from the current log file, newest first."""
+        if not os.path.exists(self.path):
+            return []
+        records = deque(maxlen=limit)
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if kind and f'"kind": "{kind}"' not in line:
+                    continue
+                records.append(line)
+        out = []
+        for line in reversed(records):
+            try:
+                out.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return out
+
+    def close(self):
+        self._listener.stop()
+
+
+_sink = None
+
+
+def get_sink():
+    global _sink
+    if _sink is None:
+        _sink = DebugSink()
+    return _sink
@@ -0,0 +1,287 @@
+# extractors.py
+import csv
+import email
+import mimetypes
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from email import policy
+from html.parser import HTMLParser
+
+import metrics
+from mcp_client import MCPHttpClient
+
+MCP_URL = os.getenv("MCP_URL", "http://localhost:8090/mcp")
+MAX_CHARS = 3000  # same limit the MCP server applies to readPDF/readDocx
+MAX_ROWS = 50     # same limit the MCP server applies to readExcel
+
+# Types the stdlib mimetypes table misses or gets wrong on some platforms
+EXTRA_MIME_TYPES = {
+    ".md": "text/markdown",
+    ".eml": "message/rfc822",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def guess_mime_type(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in EXTRA_MIME_TYPES:
+        return EXTRA_MIME_TYPES[ext]
+    mime, _ = mimetypes.guess_type(path)
+    return mime or "application/octet-stream"
+
+
+class Extractor:
+    """Base class for file extractors.
+
+    Subclasses declare the MIME types they handle, the tool name the model
+    should call for those files, and which kind of pool runs them. Each
+    extractor class gets its own executor of ``max_workers`` workers, so a
+    slow type cannot take the workers of a fast one.
+    """
+    mime_types = ()
+    tool = "extractFile"
+    pool = "thread"  # "thread" for I/O-bound or cheap work, "process" for CPU-heavy parsing
+    max_workers = 4
+
+    def extract(self, path):
+        raise NotImplementedError
+
+
+class MCPToolExtractor(Extractor):
+    """Delegates extraction to a read tool on the MCP server."""
+
+    def extract(self, path):
+        return MCPHttpClient(MCP_URL).send_request(self.tool, {"path": path})
+
+
+def _run_extractor(extractor_cls, path):
+    # Module-level so process pools can pickle it
+    return extractor_cls().extract(path)
+
+
+class ExtractorRegistry:
+    def __init__(self):
+        self._by_mime = {}
+        self._executors = {}
+
+    def register(self, extractor_cls):
+        for mime in extractor_cls.mime_types:
+            self._by_mime[mime] = extractor_cls
+        return extractor_cls
+
+    def get(self, path):
+        mime = guess_mime_type(path)
+        return self._by_mime.get(mime) or self._by_mime.get(mime.split("/")[0] + "/*")
+
+    def tools(self):
+        """Tool names served by registered extractors; calls to them can go through ``extract``."""
+        return {cls.tool for cls in self._by_mime.values()}
+
+    def tool_for(self, path):
+        """Tool name the model should call for this file, or None if no extractor handles it."""
+        extractor_cls = self.get(path)
+        return extractor_cls.tool if extractor_cls else None
+
+    def _executor(self, extractor_cls):
+        executor = self._executors.get(extractor_cls)
+        if executor is None:
+            if extractor_cls.pool == "process":
+                executor = ProcessPoolExecutor(max_workers=extractor_cls.max_workers)
+            else:
+                executor = ThreadPoolExecutor(
+                    max_workers=extractor_cls.max_workers,
+                    thread_name_prefix=extractor_cls.__name__
+                )
+            self._executors[extractor_cls] = executor
+        return executor
+
+    def submit(self, path):
+        extractor_cls = self.get(path)
+        if extractor_cls is None:
+            raise ValueError(f"No extractor registered for {guess_mime_type(path)} ({path})")
+        started = time.perf_counter()
+        future = self._executor(extractor_cls).submit(_run_extractor, extractor_cls, path)
+        future.add_done_callback(lambda f: self._record(extractor_cls, path, started, f))
+        return future
+
+    def _record(self, extractor_cls, path, started, future):
+        if future.cancelled():
+            return
+        status = "error" if future.exception() else "ok"
+        metrics.EXTRACTION_SECONDS.labels(extractor=extractor_cls.__name__, status=status).observe(
+            time.perf_counter() - started
+        )
+        if status == "ok":
+            try:
+                metrics.EXTRACTION_BYTES.labels(extractor=extractor_cls.__name__).inc(os.path.getsize(path))
+            except OSError:
+                pass
+
+    def extract(self, path, timeout=None):
+        return self.submit(path).result(timeout=timeout)
+
+    def shutdown(self, wait=True):
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait, cancel_futures=True)
+        self._executors.clear()
+
+
+registry = ExtractorRegistry()
+
+
+# --- Extractors served by the MCP server ---
+@registry.register
+class DocxExtractor(MCPToolExtractor):
+    mime_types = (EXTRA_MIME_TYPES[".docx"],)
+    tool = "readDocx"
+
+
+@registry.register
+class ExcelExtractor(MCPToolExtractor):
+    mime_types = (EXTRA_MIME_TYPES[".xlsx"], "application/vnd.ms-excel")
+    tool = "readExcel"
+
+
+# --- Local extractors ---
+@registry.register
+class PdfExtractor(Extractor):
+    mime_types = ("application/pdf",)
+    tool = "readPDF"
+    pool = "process"
+    max_workers = os.cpu_count() or 2
+
+    def extract(self, path):
+        from pypdf import PdfReader
+
+        text = []
+        size = 0
+        for page in PdfReader(path).pages:
+            page_text = page.extract_text() or ""
+            text.append(page_text)
+            size += len(page_text)
+            if size >= MAX_CHARS:
+                break
+        return "\n".join(text)[:MAX_CHARS]
+
+
+@registry.register
+class ImageExtractor(Extractor):
+    mime_types = ("image/png", "image/jpeg", "image/tiff")
+    tool = "readImageText"
+    max_workers = 2  # only waits on the OCR service, which runs its own process pool
+
+    def extract(self, path):
+        from ocr_service import read_image_text
+
+        return read_image_text(path)[:MAX_CHARS]
+
+
+@registry.register
+class TextExtractor(Extractor):
+    mime_types = ("text/plain", "text/markdown")
+    tool = "readTextFile"
+    max_workers = 8
+
+    def extract(self, path):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read(MAX_CHARS)
+
+
+@registry.register
+class CsvExtractor(Extractor):
+    mime_types = ("text/csv",)
+    max_workers = 8
+
+    def extract(self, path):
+        with open(path, newline="", encoding="utf-8", errors="replace") as f:
+            rows = []
+            for row in csv.DictReader(f):
+                rows.append(row)
+                if len(rows) >= MAX_ROWS:
+                    break
+            return rows
+
+
+class _TextOnlyHTMLParser(HTMLParser):
+    SKIP_TAGS = {"script", "style", "head"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip and data.strip():
+            self.parts.append(data.strip())
+
+
+@registry.register
+class HtmlExtractor(Extractor):
+    mime_types = ("text/html",)
+    max_workers = 4
+
+    def extract(self, path):
+        parser = _TextOnlyHTMLParser()
+        with open(path, encoding="utf-8", errors="replace") as f:
+            parser.feed(f.read())
+        return " ".join(parser.parts)[:MAX_CHARS]
+
+
+@registry.register
+class EmlExtractor(Extractor):
+    mime_types = ("message/rfc822",)
+    max_workers = 4
+
+    def extract(self, path):
+        with open(path, "rb") as f:
+            msg = email.message_from_binary_file(f, policy=policy.default)
+        body = msg.get_body(preferencelist=("plain", "html"))
+        text = body.get_content() if body else ""
+        if body is not None and body.get_content_type() == "text/html":
+            parser = _TextOnlyHTMLParser()
+            parser.feed(text)
+            text = " ".join(parser.parts)
+        return {
+            "from": msg.get("From", ""),
+            "to": msg.get("To", ""),
+            "subject": msg.get("Subject", ""),
+            "date": msg.get("Date", ""),
+            "attachments": [part.get_filename() for part in msg.iter_attachments()],
+            "body": text[:MAX_CHARS]
+        }
+
+
+@registry.register
+class PptxExtractor(Extractor):
+    mime_types = (EXTRA_MIME_TYPES[".pptx"],)
+    max_workers = 4
+
+    SLIDE_RE = re.compile(r"ppt/slides/slide(\d+)\.xml$")
+    TEXT_RE = re.compile(r"<a:t>([^<]*)</a:t>")
+
+    def extract(self, path):
+        with zipfile.ZipFile(path) as z:
+            slides = sorted(
+                (int(m.group(1)), name)
+                for name in z.namelist()
+                if (m := self.SLIDE_RE.match(name))
+            )
+            text = []
+            for number, name in slides:
+                runs = self.TEXT_RE.findall(z.read(name).decode("utf-8", errors="replace"))
+                if runs:
+                    text.append(f"[Slide {number}] " + " ".join(runs))
+        return "\n".join(text)[:MAX_CHARS]
@@ -0,0 +1,176 @@
+# graph_retriever.py
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+
+from dotenv import load_dotenv
+from neo4j import GraphDatabase
+from neo4j_graphrag.embeddings import OpenAIEmbeddings
+
+import metrics
+from llm_router import get_router, response_text
+
+load_dotenv()
+
+NEO4J_URI = os.getenv("NEO4J_URI")
+NEO4J_USER = os.getenv("NEO4J_USERNAME")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# SimpleKGPipeline's lexical graph stores chunks as (:Chunk {text, embedding})
+# and links extracted entities to them with (entity)-[:FROM_CHUNK]->(chunk)
+VECTOR_INDEX_NAME = "chunk_embeddings"
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))  # OpenAIEmbeddings default model
+EXPANSION_LABELS = ["Company", "Executive", "Product", "RiskFactor"]
+
+TOP_K = 5
+HOPS = 2
+MAX_FACTS_PER_CHUNK = 25
+MAX_CHUNK_CHARS = 1200
+MAX_CONTEXT_CHARS = 8000
+
+SYSTEM_PROMPT = (
+    "You answer questions about company filings. Use only the numbered passages and graph "
+    "facts in the context. Cite passages as [1], [2], ... If the context does not contain "
+    "the answer, say so."
+)
+
+
+# Created on first use rather than on import: the MCP server parses this script's stdout as JSON
+_driver = None
+_embedder = None
+_index_ready = False
+
+
+def get_driver():
+    global _driver
+    if _driver is None:
+        _driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    return _driver
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        _embedder = OpenAIEmbeddings(api_key=OPENAI_API_KEY)
+    return _embedder
+
+
+def ensure_vector_index(dimensions=EMBEDDING_DIMENSIONS):
+    global _index_ready
+    if _index_ready:
+        return
+    get_driver().execute_query(
+        f"CREATE VECTOR INDEX {VECTOR_INDEX_NAME} IF NOT EXISTS "
+        "FOR (c:Chunk) ON (c.embedding) "
+        "OPTIONS {indexConfig: {`vector.dimensions`: $dimensions, `vector.similarity_function`: 'cosine'}}",
+        dimensions=dimensions
+    )
+    _index_ready = True
+
+
+def _retrieval_query(hops):
+    # Variable-length bounds cannot be query parameters, so hops is formatted in (validated int)
+    return f"""
+    CALL db.index.vector.queryNodes($index_name, $top_k, $embedding) YIELD node AS chunk, score
+    OPTIONAL MATCH (chunk)<-[:FROM_CHUNK]-(e)
+    WHERE any(l IN labels(e) WHERE l IN $labels)
+    OPTIONAL MATCH p = (e)-[*1..{hops}]-(n)
+    WHERE all(x IN nodes(p) WHERE any(l IN labels(x) WHERE l IN $labels))
+    UNWIND CASE WHEN p IS NULL THEN [null] ELSE relationships(p) END AS r
+    WITH chunk, score, collect(DISTINCT e.name) AS entities,
+         collect(DISTINCT CASE WHEN r IS NULL THEN null
+                 ELSE startNode(r).name + ' ' + type(r) + ' ' + endNode(r).name END) AS facts
+    RETURN chunk.text AS text, score, entities, facts[..$max_facts] AS facts
+    ORDER BY score DESC
+    """
+
+
+def retrieve(question, top_k=TOP_K, hops=HOPS):
+    """Top-k chunks by vector similarity, each with the graph facts around its entities."""
+    hops = max(0, min(int(hops), 2))
+    ensure_vector_index()
+    embedding = get_embedder().embed_query(question)
+    if hops == 0:
+        query = """
+        CALL db.index.vector.queryNodes($index_name, $top_k, $embedding) YIELD node AS chunk, score
+        OPTIONAL MATCH (chunk)<-[:FROM_CHUNK]-(e)
+        WHERE any(l IN labels(e) WHERE l IN $labels)
+        RETURN chunk.text AS text, score, collect(DISTINCT e.name) AS entities, [] AS facts
+        ORDER BY score DESC
+        """
+    else:
+        query = _retrieval_query(hops)
+    records, _, _ = get_driver().execute_query(
+        query,
+        index_name=VECTOR_INDEX_NAME,
+        top_k=top_k,
+        embedding=embedding,
+        labels=EXPANSION_LABELS,
+        max_facts=MAX_FACTS_PER_CHUNK
+    )
+    return [record.data() for record in records]
+
+
+def build_context(hits, max_chars=MAX_CONTEXT_CHARS):
+    """Numbered passages plus de-duplicated graph facts, trimmed to a character budget."""
+    passages, facts, seen = [], [], set()
+    used = 0
+    for i, hit in enumerate(hits, start=1):
+        text = " ".join((hit.get("text") or "").split())[:MAX_CHUNK_CHARS]
+        passage = f"[{i}] {text}"
+        if used + len(passage) > max_chars:
+            break
+        passages.append(passage)
+        used += len(passage)
+        for fact in hit.get("facts") or []:
+            if fact and fact not in seen:
+                seen.add(fact)
+                facts.append(fact)
+    context = "Passages:\n" + "\n\n".join(passages)
+    if facts:
+        fact_lines = []
+        for fact in facts:
+            if used + len(fact) + 3 > max_chars:
+                break
+            fact_lines.append(f"- {fact}")
+            used += len(fact) + 3
+        context += "\n\nGraph facts:\n" + "\n".join(fact_lines)
+    return context
+
+
+def ask(question, top_k=TOP_K, hops=HOPS, max_tokens=512):
+    hits = retrieve(question, top_k=top_k, hops=hops)
+    if not hits:
+        return {"answer": "No indexed filings matched the question.", "sources": []}
+    context = build_context(hits)
+    response, _ = get_router().complete(
+        "answer",
+        [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"{context}\n\nQuestion: {question}"}
+        ],
+        max_tokens=max_tokens
+    )
+    answer = response_text(response)
+    return {
+        "answer": answer.strip(),
+        "sources": [
+            {"passage": i, "score": round(hit["score"], 4), "entities": hit["entities"]}
+            for i, hit in enumerate(hits, start=1)
+        ]
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python3 graph_retriever.py QUESTION", file=sys.stderr)
+        sys.exit(2)
+    # stdout carries only the JSON answer; anything else printed along the way goes to stderr
+    with redirect_stdout(sys.stderr):
+        try:
+            result = ask(" ".join(sys.argv[1:]))
+        finally:
+            metrics.push_to_gateway("graph_retriever")
+    print(json.dumps(result))
@@ -0,0 +1,140 @@
+# graph_schema.py
+import re
+import sys
+
+from neo4j.exceptions import Neo4jError
+
+# Labels the chat agent MERGEs on name (see SYSTEM_PROMPT in meta_frontend.py)
+AGENT_NODE_KEYS = {
+    "File": "name",
+    "Category": "name",
+    "Entity": "name",
+}
+
+# Matched as prefixes: plans name variants such as NodeUniqueIndexSeek(Locking) or NodeIndexSeekByRange
+INDEX_SEEK_OPERATORS = ("NodeUniqueIndexSeek", "NodeIndexSeek", "MultiNodeIndexSeek", "NodeIndexContainsScan",
+                        "NodeIndexEndsWithScan", "NodeIndexScan")
+SCAN_OPERATORS = ("NodeByLabelScan", "AllNodesScan")
+
+_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _identifier(name):
+    # Labels and property names cannot be query parameters, so only plain identifiers are accepted
+    if not _NAME_RE.match(name):
+        raise ValueError(f"Unsupported label or property name: {name!r}")
+    return name
+
+
+def derive_schema(entities, relations=()):
+    """Constraint and index statements for the agent labels and the declared KG entity schema.
+
+    Agent labels get uniqueness constraints because the agent MERGEs them on
+    name. KG labels get range indexes on their declared properties instead:
+    SimpleKGPipeline may write several nodes with the same name before entity
+    resolution merges them, which a uniqueness constraint would reject.
+    """
+    statements = []
+    for label, prop in AGENT_NODE_KEYS.items():
+        label, prop = _identifier(label), _identifier(prop)
+        statements.append(
+            f"CREATE CONSTRAINT {label.lower()}_{prop}_unique IF NOT EXISTS "
+            f"FOR (n:{label}) REQUIRE n.{prop} IS UNIQUE"
+        )
+    for entity in entities:
+        label = _identifier(entity["label"])
+        if label in AGENT_NODE_KEYS:
+            continue
+        for prop in entity.get("properties", []):
+            name = _identifier(prop["name"])
+            statements.append(
+                f"CREATE INDEX {label.lower()}_{name} IF NOT EXISTS FOR (n:{label}) ON (n.{name})"
+            )
+    for relation in relations:
+        rel_type = _identifier(relation["label"])
+        for prop in relation.get("properties", []):
+            name = _identifier(prop["name"])
+            statements.append(
+                f"CREATE INDEX {rel_type.lower()}_{name} IF NOT EXISTS FOR ()-[r:{rel_type}]-() ON (r.{name})"
+            )
+    return statements
+
+
+def apply_schema(driver, statements, await_seconds=300):
+    """Run each statement; returns [(statement, error)] for those Neo4j rejected.
+
+    A uniqueness constraint fails when the label already holds duplicate names;
+    the other statements still apply and ingestion carries on without it.
+    """
+    failures = []
+    for statement in statements:
+        try:
+            driver.execute_query(statement)
+        except Neo4jError as e:
+            failures.append((statement, e.message or str(e)))
+    # New indexes are populated in the background; wait so the first MERGEs can use them
+    try:
+        driver.execute_query(f"CALL db.awaitIndexes({int(await_seconds)})")
+    except Neo4jError as e:
+        failures.append(("CALL db.awaitIndexes", e.message or str(e)))
+    return failures
+
+
+def _operators(plan):
+    if plan is None:
+        return []
+    plan = plan if isinstance(plan, dict) else plan.__dict__
+    ops = [plan.get("operatorType") or plan.get("operator_type", "")]
+    for child in plan.get("children", []):
+        ops.extend(_operators(child))
+    return ops
+
+
+def index_usage_report(driver, entities):
+    """EXPLAIN a name lookup per label and report whether the planner uses an index or a scan."""
+    labels = list(AGENT_NODE_KEYS) + [e["label"] for e in entities if e["label"] not in AGENT_NODE_KEYS]
+    report = []
+    for label in labels:
+        label = _identifier(label)
+        _, summary, _ = driver.execute_query(f"EXPLAIN MERGE (n:{label} {{name: $name}})", name="x")
+        ops = [op.split("@")[0] for op in _operators(summary.plan)]
+        if any(op.startswith(INDEX_SEEK_OPERATORS) for op in ops):
+            status = "index"
+        elif any(op.startswith(SCAN_OPERATORS) for op in ops):
+            status = "scan"
+        else:
+            status = "unknown"
+        report.append({"label": label, "lookup": status, "operators": ops})
+    return report
+
+
+_bootstrapped = set()
+
+
+def bootstrap_schema(driver, entities, relations=(), report=False):
+    """Apply the derived schema once per driver; safe to call on every startup.
+
+    Rejected statements are printed and returned rather than raised, so a
+    duplicate-ridden label does not stop ingestion.
+    """
+    failures = []
+    if id(driver) not in _bootstrapped:
+        failures = apply_schema(driver, derive_schema(entities, relations))
+        _bootstrapped.add(id(driver))
+        for statement, error in failures:
+            print(f"⚠️ Schema statement not applied: {statement}\n   {error}")
+    if report:
+        for row in index_usage_report(driver, entities):
+            flag = "✅" if row["lookup"] == "index" else "⚠️"
+            print(f"{flag} MERGE (:{row['label']} {{name}}) -> {row['lookup']} ({' > '.join(row['operators'])})")
+    return failures
+
+
+if __name__ == "__main__":
+    from my_real_pdf_loader import driver, entities, relations
+
+    statements = derive_schema(entities, relations)
+    if "--dry-run" in sys.argv:
+        print(";\n".join(statements) + ";")
+    else:
+        bootstrap_schema(driver, entities, relations, report=True)
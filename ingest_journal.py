@@ -0,0 +1,177 @@
+# ingest_journal.py
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+
+INGEST_JOURNAL_PATH = os.getenv("INGEST_JOURNAL_PATH", "ingest_journal.sqlite3")
+STATUSES = ("pending", "running", "done", "failed")
+
+
+class IngestJournal:
+    """Durable per-file state for batch ingestion runs, keyed by (run_id, path)."""
+
+    def __init__(self, path=INGEST_JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_files (
+                run_id TEXT NOT NULL,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                result TEXT,
+                added_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                PRIMARY KEY (run_id, path)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ingest_files_run_status ON ingest_files (run_id, status)")
+
+    def _execute(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args)
+
+    def add(self, run_id, paths):
+        """Register paths as pending; paths already in the run keep their state. Returns the number added."""
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO ingest_files (run_id, path, status, added_at) VALUES (?, ?, 'pending', ?)",
+                [(run_id, path, now) for path in paths]
+            )
+            self._conn.execute("COMMIT")
+            return self._conn.total_changes - before
+
+    def requeue_interrupted(self, run_id):
+        """Files left running by a process that died go back to pending."""
+        return self._execute(
+            "UPDATE ingest_files SET status = 'pending' WHERE run_id = ? AND status = 'running'", (run_id,)
+        ).rowcount
+
+    def retry_failed(self, run_id):
+        return self._execute(
+            "UPDATE ingest_files SET status = 'pending' WHERE run_id = ? AND status = 'failed'", (run_id,)
+        ).rowcount
+
+    def pending(self, run_id):
+        rows = self._execute(
+            "SELECT path FROM ingest_files WHERE run_id = ? AND status = 'pending' ORDER BY path", (run_id,)
+        ).fetchall()
+        return [row["path"] for row in rows]
+
+    def mark_running(self, run_id, path):
+        self._execute(
+            "UPDATE ingest_files SET status = 'running', attempts = attempts + 1, error = NULL, started_at = ? "
+            "WHERE run_id = ? AND path = ?",
+            (time.time(), run_id, path)
+        )
+
+    def mark_done(self, run_id, path, result=None):
+        self._execute(
+            "UPDATE ingest_files SET status = 'done', result = ?, finished_at = ? WHERE run_id = ? AND path = ?",
+            (json.dumps(result) if result is not None else None, time.time(), run_id, path)
+        )
+
+    def mark_failed(self, run_id, path, error):
+        self._execute(
+            "UPDATE ingest_files SET status = 'failed', error = ?, finished_at = ? WHERE run_id = ? AND path = ?",
+            (error, time.time(), run_id, path)
+        )
+
+    def counts(self, run_id):
+        rows = self._execute(
+            "SELECT status, COUNT(*) AS n FROM ingest_files WHERE run_id = ? GROUP BY status", (run_id,)
+        ).fetchall()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def failures(self, run_id):
+        rows = self._execute(
+            "SELECT path, attempts, error FROM ingest_files WHERE run_id = ? AND status = 'failed' ORDER BY path",
+            (run_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        self._conn.close()
+
+
+async def run_batch(journal, run_id, paths, retry_failed=False, concurrency=1):
+    """Ingest every pending file of the run; done files are skipped, so a rerun resumes where it stopped."""
+    from my_real_pdf_loader import get_pipeline_for_file, prepare_schema, run_pipeline_on_file
+
+    prepare_schema()
+    added = journal.add(run_id, paths)
+    requeued = journal.requeue_interrupted(run_id)
+    retried = journal.retry_failed(run_id) if retry_failed else 0
+    todo = journal.pending(run_id)
+    print(f"[INFO] Run {run_id}: {added} new, {requeued} interrupted, {retried} retried, {len(todo)} to process")
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def ingest(path):
+        async with semaphore:
+            journal.mark_running(run_id, path)
+            try:
+                report = await run_pipeline_on_file(path, get_pipeline_for_file(path), raise_errors=True)
+            except Exception as e:
+                journal.mark_failed(run_id, path, f"{type(e).__name__}: {e}")
+            else:
+                journal.mark_done(run_id, path, report)
+
+    await asyncio.gather(*(ingest(path) for path in todo))
+    return journal.counts(run_id)
+
+
+def _collect_pdfs(targets):
+    paths = []
+    for target in targets:
+        if os.path.isdir(target):
+            paths.extend(glob.glob(os.path.join(target, "**", "*.pdf"), recursive=True))
+        else:
+            paths.append(target)
+    return sorted(os.path.abspath(p) for p in paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumable batch ingestion of PDFs into the knowledge graph")
+    parser.add_argument("targets", nargs="+", help="PDF files or directories (searched recursively)")
+    parser.add_argument("--run-id", help="journal run id (default: the targets, so reruns resume)")
+    parser.add_argument("--retry-failed", action="store_true", help="re-queue files that failed in earlier attempts")
+    parser.add_argument("--concurrency", type=int, default=1, help="documents ingested at once")
+    parser.add_argument("--status", action="store_true", help="print the run's state and exit")
+    parser.add_argument("--journal", default=INGEST_JOURNAL_PATH)
+    args = parser.parse_args()
+
+    run_id = args.run_id or "|".join(os.path.abspath(t) for t in args.targets)
+    journal = IngestJournal(args.journal)
+    try:
+        if not args.status:
+            asyncio.run(run_batch(journal, run_id, _collect_pdfs(args.targets),
+                                  retry_failed=args.retry_failed, concurrency=args.concurrency))
+        counts = journal.counts(run_id)
+        print(" | ".join(f"{status}: {counts[status]}" for status in STATUSES))
+        for failure in journal.failures(run_id):
+            print(f"❌ {failure['path']} (attempts: {failure['attempts']}): {failure['error']}")
+    finally:
+        journal.close()
+        metrics.push_to_gateway("ingest_journal")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+# job_service.py
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import metrics
+from mcp_client import MCPHttpClient
+from tenants import DEFAULT_QUOTAS, DEFAULT_ROOT, DEFAULT_TENANT, PathNotAllowed, Tenant, get_tenant
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.sqlite3")
+JOB_SERVICE_PORT = int(os.getenv("JOB_SERVICE_PORT", "8095"))
+JOB_METRICS_PORT = int(os.getenv("JOB_METRICS_PORT", "9465"))  # process_pdf ingestion metrics are scraped here
+MCP_URL = os.getenv("MCP_URL", "http://localhost:8090/mcp")
+
+# Maximum concurrently running jobs per kind; each tenant is further capped by its max_jobs quota
+JOB_LIMITS = {
+    "mcp_tool": 8,
+    "process_pdf": 2,
+    "extract_directory": 2,
+}
+TERMINAL_STATES = ("done", "failed", "cancelled")
+MAX_LIST_LIMIT = 500  # most jobs GET /jobs returns at once
+# MCP tools that extract file content, charged to the job's tenant extraction quota
+EXTRACTION_TOOLS = {"processPdf", "readPDF", "readDocx", "readExcel", "readImageText", "readTextFile"}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """Passed to handlers so long jobs can check for cancellation between steps.
+
+    ``tenant`` is the job's tenant, whose quotas the handler runs under.
+    """
+
+    def __init__(self, store, job_id, tenant_id=DEFAULT_TENANT):
+        self.store = store
+        self.job_id = job_id
+        self.tenant_id = tenant_id
+
+    @property
+    def tenant(self):
+        try:
+            return get_tenant(self.tenant_id)
+        except KeyError:
+            # A tenant since removed from tenants.json still drains its jobs, at the default quotas
+            return Tenant(self.tenant_id, DEFAULT_ROOT)
+
+    def cancelled(self):
+        return self.store.cancel_requested(self.job_id)
+
+    def check_cancelled(self):
+        if self.cancelled():
+            raise JobCancelled()
+
+
+# --- Job handlers ---
+HANDLERS = {}
+
+
+def job_handler(kind):
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+@job_handler("mcp_tool")
+def run_mcp_tool(params, ctx):
+    if params["tool"] not in EXTRACTION_TOOLS:
+        ctx.check_cancelled()
+        return MCPHttpClient(MCP_URL).send_request(params["tool"], params.get("arguments", {}))
+    with ctx.tenant.limit("extraction", timeout=None):
+        # Last chance to stop: once the request is sent its side effect (e.g. a Neo4j write) happens
+        ctx.check_cancelled()
+        return MCPHttpClient(MCP_URL).send_request(params["tool"], params.get("arguments", {}))
+
+
+@job_handler("process_pdf")
+def run_process_pdf(params, ctx):
+    from my_real_pdf_loader import get_pipeline_for_file, prepare_schema, run_pipeline_on_file
+
+    prepare_schema()  # applied by the first job only; later calls return at once
+    with ctx.tenant.limit("extraction", timeout=None):
+        ctx.check_cancelled()
+        return asyncio.run(
+            run_pipeline_on_file(params["path"], get_pipeline_for_file(params["path"]), raise_errors=True)
+        )
+
+
+@job_handler("extract_directory")
+def run_extract_directory(params, ctx):
+    from extractors import registry
+
+    root = ctx.tenant.resolve(params["path"])
+    paths = {}
+    for name in sorted(os.listdir(root)):
+        # Symlinks are resolved so none can lead the job outside the tenant's root
+        try:
+            path = ctx.tenant.resolve(os.path.join(root, name))
+        except PathNotAllowed:
+            print(f"[WARNING] Skipping {name}: it resolves outside the tenant root")
+            continue
+        if os.path.isfile(path) and registry.get(path):
+            paths[name] = path
+    results = {}
+    with ctx.tenant.limit("extraction", timeout=None):
+        futures = {name: registry.submit(path) for name, path in paths.items()}
+        try:
+            for name, future in futures.items():
+                ctx.check_cancelled()
+                try:
+                    results[name] = {"result": future.result()}
+                except Exception as e:
+                    results[name] = {"error": str(e)}
+        finally:
+            for future in futures.values():
+                future.cancel()
+    return results
+
+
+# --- Persistent queue ---
+class JobStore:
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "tenant" not in columns:
+            # Databases created before tenants existed: their jobs belong to the default tenant
+            self._conn.execute(f"ALTER TABLE jobs ADD COLUMN tenant TEXT NOT NULL DEFAULT '{DEFAULT_TENANT}'")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    def _execute(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args)
+
+    def requeue_interrupted(self):
+        """Jobs left running by a previous process go back to the queue."""
+        return self._execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+
+    def submit(self, kind, params, tenant=DEFAULT_TENANT):
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, kind, params, status, tenant, created_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+            (job_id, kind, json.dumps(params), tenant, time.time())
+        )
+        return job_id
+
+    def claim(self, kind, exclude_tenants=()):
+        """Oldest queued job of ``kind``, skipping tenants already at their job quota."""
+        exclude_tenants = list(exclude_tenants)
+        skip = f" AND tenant NOT IN ({', '.join('?' * len(exclude_tenants))})" if exclude_tenants else ""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT * FROM jobs WHERE status = 'queued' AND kind = ?{skip} ORDER BY created_at LIMIT 1",
+                    (kind, *exclude_tenants)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ? WHERE id = ?",
+                        (time.time(), row["id"])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def finish(self, job_id, status, result=None, error=None):
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id)
+        )
+
+    def cancel(self, job_id):
+        """Queued jobs are cancelled at once; running jobs are flagged and stop at their next check."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id):
+        row = self._execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def get(self, job_id):
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, status=None, limit=50):
+        if status:
+            rows = self._execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+            ).fetchall()
+        else:
+            rows = self._execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row, include_result=False) for row in rows]
+
+    @staticmethod
+    def _to_dict(row, include_result=True):
+        job = {k: row[k] for k in row.keys() if k not in ("params", "result")}
+        job["params"] = json.loads(row["params"])
+        job["cancel_requested"] = bool(row["cancel_requested"])
+        if include_result:
+            job["result"] = json.loads(row["result"]) if row["result"] else None
+        return job
+
+
+def tenant_job_limit(tenant_id):
+    try:
+        return get_tenant(tenant_id).quotas["max_jobs"]
+    except KeyError:
+        # Jobs of a tenant since removed from tenants.json still drain, at the default quota
+        return DEFAULT_QUOTAS["max_jobs"]
+
+
+class JobRunner:
+    """Moves queued jobs onto one executor per kind, sized by JOB_LIMITS.
+
+    Within a kind no tenant runs more than its max_jobs quota at once, so one
+    tenant's backlog cannot hold every slot while others wait.
+    """
+
+    def __init__(self, store, limits=JOB_LIMITS, poll_interval=0.5):
+        self.store = store
+        self.limits = limits
+        self.poll_interval = poll_interval
+        self._executors = {kind: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"job-{kind}")
+                           for kind, n in limits.items()}
+        self._running = {kind: 0 for kind in limits}
+        self._tenant_running = {}  # (kind, tenant) -> running jobs
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def notify(self):
+        self._wake.set()
+
+    def start(self):
+        requeued = self.store.requeue_interrupted()
+        if requeued:
+            print(f"[INFO] Re-queued {requeued} job(s) interrupted by the last shutdown")
+        threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            for kind, limit in self.limits.items():
+                while True:
+                    with self._lock:
+                        if self._running[kind] >= limit:
+                            break
+                        full = [
+                            tenant for (k, tenant), n in self._tenant_running.items()
+                            if k == kind and n >= tenant_job_limit(tenant)
+                        ]
+                    row = self.store.claim(kind, exclude_tenants=full)
+                    if row is None:
+                        break
+                    with self._lock:
+                        self._running[kind] += 1
+                        key = (kind, row["tenant"])
+                        self._tenant_running[key] = self._tenant_running.get(key, 0) + 1
+                    self._executors[kind].submit(self._run, row)
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _run(self, row):
+        job_id, kind = row["id"], row["kind"]
+        ctx = JobContext(self.store, job_id, row["tenant"])
+        try:
+            handler = HANDLERS.get(kind)
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {kind}")
+            result = handler(json.loads(row["params"]), ctx)
+            # A handler that returned has done its work; a cancel that arrived meanwhile came too late
+            self.store.finish(job_id, "done", result=result)
+        except JobCancelled:
+            self.store.finish(job_id, "cancelled")
+        except Exception as e:
+            print(f"[ERROR] Job {job_id} ({kind}) failed: {e}")
+            self.store.finish(job_id, "failed", error=str(e))
+        finally:
+            with self._lock:
+                self._running[kind] -= 1
+                key = (kind, row["tenant"])
+                self._tenant_running[key] -= 1
+                if not self._tenant_running[key]:
+                    del self._tenant_running[key]
+            self.notify()
+
+
+# --- HTTP API ---
+def make_handler(store, runner):
+    class JobHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            data = json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            parts = self.path.split("?")[0].strip("/").split("/")
+            if parts == ["health"]:
+                return self._send(200, {"status": "ok"})
+            if parts == ["jobs"]:
+                query = dict(p.split("=", 1) for p in self.path.partition("?")[2].split("&") if "=" in p)
+                try:
+                    limit = int(query.get("limit", 50))
+                except ValueError:
+                    limit = 0
+                if not 1 <= limit <= MAX_LIST_LIMIT:
+                    return self._send(400, {"error": f"limit must be an integer from 1 to {MAX_LIST_LIMIT}"})
+                return self._send(200, store.list(status=query.get("status"), limit=limit))
+            if len(parts) == 2 and parts[0] == "jobs":
+                job = store.get(parts[1])
+                return self._send(200, job) if job else self._send(404, {"error": "Job not found"})
+            self._send(404, {"error": "Not found"})
+
+        def do_POST(self):
+            parts = self.path.split("?")[0].strip("/").split("/")
+            if parts == ["jobs"]:
+                body = self._read_json()
+                kind = body.get("kind")
+                if kind not in HANDLERS:
+                    return self._send(400, {"error": f"Unknown job kind: {kind}"})
+                params = body.get("params", {})
+                try:
+                    tenant = get_tenant(body.get("tenant"))
+                    # File paths are checked against the tenant root here, before anything runs
+                    for args in (params, params.get("arguments") or {}):
+                        if "path" in args:
+                            args["path"] = tenant.resolve(args["path"])
+                except KeyError as e:
+                    return self._send(400, {"error": e.args[0]})
+                except PathNotAllowed as e:
+                    return self._send(403, {"error": str(e)})
+                job_id = store.submit(kind, params, tenant=tenant.id)
+                runner.notify()
+                return self._send(202, {"id": job_id, "status": "queued"})
+            if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+                job = store.cancel(parts[1])
+                return self._send(200, job) if job else self._send(404, {"error": "Job not found"})
+            self._send(404, {"error": "Not found"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return JobHandler
+
+
+def serve(port=JOB_SERVICE_PORT, db_path=JOB_DB_PATH):
+    store = JobStore(db_path)
+    runner = JobRunner(store)
+    runner.start()
+    metrics.start_http_server(JOB_METRICS_PORT)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(store, runner))
+    print(f"Job service running on port {port} (db: {db_path})")
+    try:
+        server.serve_forever()
+    finally:
+        runner.stop()
+
+
+# --- Client used by the UI ---
+class JobClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def submit(self, kind, params, tenant=None):
+        body = {"kind": kind, "params": params}
+        if tenant is not None:
+            body["tenant"] = tenant
+        response = requests.post(f"{self.base_url}/jobs", json=body, timeout=10)
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def get(self, job_id):
+        response = requests.get(f"{self.base_url}/jobs/{job_id}", timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    def cancel(self, job_id):
+        response = requests.post(f"{self.base_url}/jobs/{job_id}/cancel", timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    def wait(self, job_id, timeout=None, poll_interval=1.0):
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            job = self.get(job_id)
+            if job["status"] in TERMINAL_STATES:
+                return job
+            if deadline and time.monotonic() > deadline:
+                raise TimeoutError(f"Job {job_id} still {job['status']} after {timeout}s")
+            time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    serve()
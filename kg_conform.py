@@ -0,0 +1,113 @@
+# kg_conform.py
+import json
+
+
+class ConformError(ValueError):
+    """Raised when LLM output cannot be used at all; ``errors`` holds the errors found so far, the fatal one last."""
+
+    def __init__(self, message, errors=()):
+        super().__init__(message)
+        self.errors = list(errors)
+
+
+class KGSchema:
+    """Lookup tables for the declared ``entities``/``relations`` lists, built once per pipeline."""
+
+    def __init__(self, entities, relations):
+        self.entity_props = {
+            e["label"]: frozenset(p["name"] for p in e.get("properties", []))
+            for e in entities
+        }
+        self.relation_types = frozenset(r["label"] for r in relations)
+
+
+def _properties(item, path, errors):
+    props = item.get("properties")
+    if props is None or props == []:
+        # The LLM often emits [] for "no properties"; the pipeline expects a map
+        item["properties"] = {}
+        return True
+    if not isinstance(props, dict):
+        errors.append(f"{path}.properties: expected object, got {type(props).__name__}")
+        return False
+    return True
+
+
+def conform(obj, schema):
+    """Validate and normalize extraction output in one pass, in place.
+
+    Returns ``(output, errors)``: ``output`` is ``{"entities": [...], "relations": [...]}``
+    holding the original item dicts that passed validation, and ``errors`` lists
+    one message per dropped item or field, e.g. ``entities[3].label: undeclared label 'Person'``.
+    Raises ConformError if ``obj`` is not an extraction object at all.
+    """
+    if not isinstance(obj, dict):
+        message = f"expected a JSON object at top level, got {type(obj).__name__}"
+        raise ConformError(message, [message])
+    raw_entities = obj.get("entities", [])
+    raw_relations = obj.get("relations", [])
+    errors = []
+    if not isinstance(raw_relations, list):
+        errors.append(f"relations: expected array, got {type(raw_relations).__name__}")
+        raw_relations = []
+    for key in obj.keys() - {"entities", "relations"}:
+        errors.append(f"{key}: unexpected top-level key ignored")
+    if not isinstance(raw_entities, list):
+        message = f"entities: expected array, got {type(raw_entities).__name__}"
+        raise ConformError(message, errors + [message])
+
+    entity_props = schema.entity_props
+    kept_entities, ids = [], set()
+    for i, item in enumerate(raw_entities):
+        path = f"entities[{i}]"
+        if not isinstance(item, dict):
+            errors.append(f"{path}: expected object, got {type(item).__name__}")
+            continue
+        label = item.get("label")
+        if label not in entity_props:
+            errors.append(f"{path}.label: undeclared label {label!r}")
+            continue
+        entity_id = item.get("id")
+        if entity_id is None:
+            errors.append(f"{path}.id: missing")
+            continue
+        if not _properties(item, path, errors):
+            continue
+        allowed = entity_props[label]
+        for name in [k for k in item["properties"] if k not in allowed]:
+            errors.append(f"{path}.properties.{name}: not declared for {label}")
+            del item["properties"][name]
+        ids.add(entity_id)
+        kept_entities.append(item)
+
+    relation_types = schema.relation_types
+    kept_relations = []
+    for i, item in enumerate(raw_relations):
+        path = f"relations[{i}]"
+        if not isinstance(item, dict):
+            errors.append(f"{path}: expected object, got {type(item).__name__}")
+            continue
+        rel_type = item.get("type", item.get("label"))
+        if rel_type not in relation_types:
+            errors.append(f"{path}.type: undeclared relation {rel_type!r}")
+            continue
+        start, end = item.get("start_node_id"), item.get("end_node_id")
+        if start not in ids or end not in ids:
+            missing = start if start not in ids else end
+            errors.append(f"{path}: references unknown entity id {missing!r}")
+            continue
+        if not _properties(item, path, errors):
+            continue
+        kept_relations.append(item)
+
+    return {"entities": kept_entities, "relations": kept_relations}, errors
+
+
+def loads_and_conform(content, schema):
+    """``json.loads`` + ``conform``; raises ConformError with the parse position on bad JSON."""
+    try:
+        obj = json.loads(content)
+    except (TypeError, json.JSONDecodeError) as e:
+        message = f"invalid JSON: {e}"
+        raise ConformError(message, [message]) from e
+    return conform(obj, schema)
@@ -7,6 +7,8 @@ import urllib3
 import traceback
 from dotenv import load_dotenv
 
+from weather_service import get_weather_many, split_locations
+
 # --- Load environment variables ---
 load_dotenv()
 
@@ -21,34 +23,10 @@ MAX_CONVERSATION_TURNS = 10
 
 # --- Get API keys ---
 LLAMA_API_KEY = os.getenv("LLAMA_API_KEY")
-OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 if not LLAMA_API_KEY:
     st.error("🚨 Missing LLAMA_API_KEY environment variable.")
     st.stop()
 
-# --- Weather Tool Function ---
-def get_weather(location):
-    endpoint = "https://api.openweathermap.org/data/2.5/weather"
-    params = {
-        "q": location,
-        "appid": OPENWEATHER_API_KEY,
-        "units": "imperial"
-    }
-    response = requests.get(endpoint, params=params, verify=False)
-    if response.status_code == 200:
-        data = response.json()
-        return {
-            "location": f"{data['name']}, {data['sys']['country']}",
-            "temperature": f"{data['main']['temp']} °F",
-            "description": data['weather'][0]['description'].capitalize(),
-            "humidity": f"{data['main']['humidity']}%",
-            "wind_speed": f"{data['wind']['speed']} mph"
-        }
-    else:
-        return {
-            "error": f"HTTP {response.status_code}: {response.text}"
-        }
-
 # --- Initialize session state ---
 if "conversation_history" not in st.session_state:
     st.session_state.conversation_history = []
@@ -70,9 +48,10 @@ if prompt := st.chat_input("What would you like to ask?"):
     # --- Manual weather detection ---
     if "weather in" in prompt.lower():
         try:
-            city = prompt.lower().split("weather in")[1].strip().rstrip("?")
-            weather = get_weather(city)
-            assistant_content = json.dumps(weather, indent=2)
+            # "weather in Beijing, Tokyo and Paris" looks up all three in parallel
+            cities = split_locations(prompt[prompt.lower().index("weather in") + len("weather in"):])
+            weather = get_weather_many(cities)
+            assistant_content = json.dumps(weather[0] if len(weather) == 1 else weather, indent=2)
             assistant_message = {"role": "assistant", "content": assistant_content}
             st.session_state.conversation_history.append(assistant_message)
             st.rerun()
@@ -0,0 +1,247 @@
+# llm_router.py
+import json
+import os
+import threading
+import time
+
+import requests
+import urllib3
+
+import metrics
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+LLAMA_API_URL = "https://api.llama.com/v1/chat/completions"
+OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+
+EWMA_ALPHA = 0.3           # weight of the newest latency sample
+SPIKE_FACTOR = 3.0         # a call slower than this multiple of the backend's EWMA fails over
+MIN_SPIKE_TIMEOUT = 20     # seconds; never cut a call off sooner than this
+SPIKE_EXEMPT_TASKS = {"extract"}  # long structured outputs whose latency varies too much to cut off early
+FAILURE_COOLDOWN = 30      # seconds a backend is skipped after consecutive failures
+MAX_CONSECUTIVE_FAILURES = 3
+
+
+class LLMRouterError(Exception):
+    def __init__(self, task, errors):
+        detail = "; ".join(f"{name}: {error}" for name, error in errors) or "no backend available"
+        super().__init__(f"All LLM backends failed for task '{task}': {detail}")
+        self.task = task
+        self.errors = errors
+
+
+class LLMBackend:
+    """One model endpoint. ``chat`` returns a Llama API style response dict.
+
+    ``strength`` ranks output quality (higher is better) and ``expected_latency``
+    seeds each task's latency EWMA until real samples arrive. Latency is tracked
+    per task because a chat reply and a chunk extraction differ by an order of magnitude.
+    """
+
+    def __init__(self, name, model, api_key, strength=1, expected_latency=5.0, max_concurrency=4):
+        self.name = name
+        self.model = model
+        self.api_key = api_key
+        self.strength = strength
+        self.max_concurrency = max_concurrency
+        self.expected_latency = expected_latency
+        self.latency_ewma = {}  # task -> smoothed seconds
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return time.monotonic() >= self.cooldown_until
+
+    def latency(self, task):
+        return self.latency_ewma.get(task, self.expected_latency)
+
+    def record(self, task, seconds, ok, timed_out=False):
+        """``timed_out`` marks a call cut off after ``seconds``: a lower bound on its latency,
+        so it still moves the EWMA up instead of leaving the next timeout just as short."""
+        with self._lock:
+            if ok or timed_out:
+                self.latency_ewma[task] = EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self.latency(task)
+            if ok:
+                self.consecutive_failures = 0
+            else:
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                    self.cooldown_until = time.monotonic() + FAILURE_COOLDOWN
+        metrics.LLM_BACKEND_LATENCY.labels(backend=self.name, task=task).set(self.latency(task))
+
+    def chat(self, messages, max_tokens=512, timeout=180, json_mode=False, **options):
+        raise NotImplementedError
+
+
+class LlamaBackend(LLMBackend):
+    def chat(self, messages, max_tokens=512, timeout=180, json_mode=False, **options):
+        # The Llama API has no plain JSON mode; callers that set json_mode also ask for JSON in the prompt
+        payload = {"model": self.model, "messages": messages, "max_tokens": max_tokens, **options}
+        response = requests.post(
+            LLAMA_API_URL,
+            headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+            json=payload,
+            verify=False,
+            timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI chat completions, translated to the Llama API response shape the callers parse."""
+
+    def chat(self, messages, max_tokens=512, timeout=180, json_mode=False, **options):
+        # Chat history entries carry extra keys (e.g. stop_reason) that OpenAI rejects
+        messages = [
+            {"role": m["role"], "content": m["content"] if isinstance(m["content"], str) else json.dumps(m["content"])}
+            for m in messages
+        ]
+        payload = {"model": self.model, "messages": messages, "max_tokens": max_tokens, **options}
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        response = requests.post(
+            OPENAI_API_URL,
+            headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+            json=payload,
+            timeout=timeout
+        )
+        response.raise_for_status()
+        body = response.json()
+        choice = body["choices"][0]
+        message = choice["message"]
+        completion_message = {
+            "role": "assistant",
+            "content": {"type": "text", "text": message.get("content") or ""},
+            "stop_reason": choice.get("finish_reason"),
+        }
+        tool_calls = message.get("tool_calls") or []
+        if tool_calls:
+            function = tool_calls[0]["function"]
+            completion_message["tool_call"] = {
+                "name": function["name"],
+                "arguments": json.loads(function.get("arguments") or "{}")
+            }
+        usage = body.get("usage") or {}
+        return {
+            "completion_message": completion_message,
+            "metrics": [
+                {"metric": "num_prompt_tokens", "value": usage.get("prompt_tokens", 0)},
+                {"metric": "num_completion_tokens", "value": usage.get("completion_tokens", 0)},
+                {"metric": "num_total_tokens", "value": usage.get("total_tokens", 0)},
+            ]
+        }
+
+
+# Routing policy per task: "fastest" orders by latency EWMA, "strongest" by strength,
+# a list is a fixed preference order. Backends not named in a list are never used for it.
+TASK_ROUTES = {
+    "chat": ["llama-maverick", "openai-gpt-4o"],
+    "classify": "fastest",
+    "extract": "strongest",
+    "answer": "strongest",  # graph_retriever's answer synthesis over retrieved filings
+}
+
+
+def default_backends():
+    backends = []
+    llama_key, openai_key = os.getenv("LLAMA_API_KEY"), os.getenv("OPENAI_API_KEY")
+    if llama_key:
+        backends.append(LlamaBackend("llama-maverick", "Llama-4-Maverick-17B-128E-Instruct-FP8", llama_key,
+                                     strength=2, expected_latency=4.0, max_concurrency=8))
+        backends.append(LlamaBackend("llama-scout", "Llama-4-Scout-17B-16E-Instruct-FP8", llama_key,
+                                     strength=1, expected_latency=2.0, max_concurrency=8))
+    if openai_key:
+        backends.append(OpenAIBackend("openai-gpt-4o", "gpt-4o", openai_key,
+                                      strength=3, expected_latency=6.0, max_concurrency=8))
+        backends.append(OpenAIBackend("openai-gpt-4o-mini", "gpt-4o-mini", openai_key,
+                                      strength=1, expected_latency=2.5, max_concurrency=8))
+    return backends
+
+
+class LLMRouter:
+    """Picks a backend per task, enforces per-backend concurrency quotas and fails over on errors."""
+
+    def __init__(self, backends, routes=TASK_ROUTES):
+        self.backends = {backend.name: backend for backend in backends}
+        self.routes = routes
+
+    def candidates(self, task):
+        route = self.routes.get(task, "strongest")
+        if route == "fastest":
+            ordered = sorted(self.backends.values(), key=lambda b: b.latency(task))
+        elif route == "strongest":
+            ordered = sorted(self.backends.values(), key=lambda b: (-b.strength, b.latency(task)))
+        else:
+            ordered = [self.backends[name] for name in route if name in self.backends]
+        # Backends cooling down after repeated failures go last rather than disappearing
+        return sorted(ordered, key=lambda b: not b.available)
+
+    def complete(self, task, messages, max_tokens=512, timeout=180, **options):
+        """Run a chat completion for ``task``; returns ``(response, backend)``."""
+        candidates = self.candidates(task)
+        errors = []
+        # First pass only takes free slots so a saturated backend fails over; the last resort waits
+        for i, backend in enumerate(candidates):
+            last = i == len(candidates) - 1
+            if not backend._slots.acquire(blocking=last):
+                errors.append((backend.name, "concurrency quota full"))
+                continue
+            try:
+                call_timeout = timeout if last or task in SPIKE_EXEMPT_TASKS else min(
+                    timeout, max(MIN_SPIKE_TIMEOUT, SPIKE_FACTOR * backend.latency(task))
+                )
+                started = time.perf_counter()
+                try:
+                    response = backend.chat(messages, max_tokens=max_tokens, timeout=call_timeout, **options)
+                except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                    elapsed = time.perf_counter() - started
+                    backend.record(task, elapsed, ok=False,
+                                   timed_out=isinstance(e, requests.exceptions.ReadTimeout))
+                    status = getattr(getattr(e, "response", None), "status_code", None) or type(e).__name__
+                    metrics.LLM_REQUEST_SECONDS.labels(model=backend.model, status=status).observe(elapsed)
+                    errors.append((backend.name, str(e)))
+                    if not last:
+                        metrics.LLM_FAILOVERS.labels(task=task, backend=backend.name).inc()
+                        print(f"[WARNING] LLM backend {backend.name} failed for {task}, failing over: {e}")
+                    continue
+                elapsed = time.perf_counter() - started
+                backend.record(task, elapsed, ok=True)
+                metrics.LLM_REQUEST_SECONDS.labels(model=backend.model, status=200).observe(elapsed)
+                for metric in response.get("metrics", []):
+                    if metric.get("metric") in ("num_prompt_tokens", "num_completion_tokens"):
+                        kind = metric["metric"][len("num_"):-len("_tokens")]
+                        metrics.LLM_TOKENS.labels(model=backend.model, kind=kind).inc(metric.get("value") or 0)
+                return response, backend
+            finally:
+                backend._slots.release()
+        raise LLMRouterError(task, errors)
+
+    def stats(self):
+        return [
+            {
+                "backend": b.name, "model": b.model,
+                "latency_ewma": {task: round(b.latency(task), 3) for task in self.routes},
+                "available": b.available, "consecutive_failures": b.consecutive_failures,
+                "max_concurrency": b.max_concurrency,
+            }
+            for b in self.backends.values()
+        ]
+
+
+def response_text(response):
+    content = (response.get("completion_message") or {}).get("content", {})
+    return content.get("text", "") if isinstance(content, dict) else str(content)
+
+
+_router = None
+
+
+def get_router():
+    global _router
+    if _router is None:
+        _router = LLMRouter(default_backends())
+    return _router
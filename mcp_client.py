@@ -21,15 +21,46 @@ class MCPHttpClient:
             raise Exception(f"[{result['error']['code']}] {result['error']['message']}")
         return result['result']
 
+    def walk_pages(self, path, page_size=200, include=None, exclude=None, recursive=True, max_depth=None, sniff=False):
+        """Yield pages of walkDir entries, following the cursor until the tree is exhausted."""
+        params = {
+            "path": path,
+            "pageSize": page_size,
+            "recursive": recursive,
+            "include": include or [],
+            "exclude": exclude or [],
+            "sniff": sniff
+        }
+        if max_depth is not None:
+            params["maxDepth"] = max_depth
+        while True:
+            page = self.send_request("walkDir", params)
+            yield page["entries"]
+            if not page.get("nextCursor"):
+                return
+            params["cursor"] = page["nextCursor"]
+
+    def walk(self, path, **kwargs):
+        """Yield walkDir entries one by one (path, type, size, mtimeMs, ino, mime)."""
+        for entries in self.walk_pages(path, **kwargs):
+            yield from entries
+
 def main():
+    from tenants import get_tenant
     client = MCPHttpClient("http://localhost:8090/mcp")
+    root = get_tenant().root
 
     # List contents
-    result = client.send_request("listDir", {"path": "/Users/ethancheung/Downloads"})
-    print("📁 Downloads:", result)
+    result = client.send_request("listDir", {"path": root})
+    print(f"📁 {root}:", result)
+
+    # Recursive walk, streamed one page at a time
+    for entry in client.walk(root, exclude=["node_modules", ".*"]):
+        if entry["type"] == "file":
+            print(f"📄 {entry['relPath']} ({entry['mime']}, {entry['size']} bytes)")
 
     # Optional: read a file
-    # content = client.send_request("readFile", {"path": "/Users/ethancheung/Downloads/example.txt"})
+    # content = client.send_request("readFile", {"path": f"{root}/example.txt"})
     # print("📄 example.txt contents:", content)
 
 if __name__ == "__main__":
@@ -0,0 +1,177 @@
+# mcp_stdio_client.py
+import asyncio
+import itertools
+import json
+
+PROTOCOL_VERSION = "2024-11-05"
+CLIENT_INFO = {"name": "mcp-graph-agent", "version": "1.0.0"}
+STREAM_LIMIT = 64 * 1024 * 1024  # one JSON-RPC message per line; file reads can be large
+
+
+class MCPError(Exception):
+    def __init__(self, code, message, data=None):
+        super().__init__(f"[{code}] {message}")
+        self.code = code
+        self.message = message
+        self.data = data
+
+
+class AsyncMCPClient:
+    """Asyncio JSON-RPC client for a stdio MCP server.
+
+    Requests are written to the child's stdin and a background reader task
+    matches responses to pending futures by ``id``, so any number of calls
+    can be in flight over the one pipe. Server notifications are passed to
+    handlers registered with ``on_notification``.
+    """
+
+    def __init__(self, server_cmd, request_timeout=60):
+        self.server_cmd = server_cmd
+        self.request_timeout = request_timeout
+        self.process = None
+        self.server_info = None
+        self.server_capabilities = None
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._handlers = {}
+        self._write_lock = asyncio.Lock()
+        self._tasks = []
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.server_cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=STREAM_LIMIT
+        )
+        self._tasks = [
+            asyncio.create_task(self._read_stdout()),
+            asyncio.create_task(self._read_stderr())
+        ]
+        try:
+            await self.initialize()
+        except BaseException:
+            await self.close()
+            raise
+        return self
+
+    async def initialize(self):
+        result = await self.request("initialize", {
+            "protocolVersion": PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": CLIENT_INFO
+        })
+        self.server_info = result.get("serverInfo")
+        self.server_capabilities = result.get("capabilities", {})
+        await self.notify("notifications/initialized")
+        return result
+
+    @property
+    def outstanding(self):
+        return len(self._pending)
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.returncode is None
+
+    def on_notification(self, method, handler):
+        """Register handler(params) for a server notification; method "*" receives all of them."""
+        self._handlers.setdefault(method, []).append(handler)
+
+    async def _send(self, message):
+        if not self.alive:
+            raise ConnectionError("MCP server process is not running")
+        data = (json.dumps(message) + "\n").encode("utf-8")
+        async with self._write_lock:
+            self.process.stdin.write(data)
+            await self.process.stdin.drain()
+
+    async def request(self, method, params=None, timeout=None):
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._send({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}})
+            return await asyncio.wait_for(future, timeout or self.request_timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def notify(self, method, params=None):
+        message = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+        await self._send(message)
+
+    async def list_tools(self):
+        return (await self.request("tools/list"))["tools"]
+
+    async def call_tool(self, name, arguments=None, timeout=None):
+        return await self.request("tools/call", {"name": name, "arguments": arguments or {}}, timeout=timeout)
+
+    async def _read_stdout(self):
+        try:
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    print("[MCP SERVER STDOUT]", line.decode("utf-8", errors="replace").strip())
+                    continue
+                await self._dispatch(message)
+        finally:
+            error = ConnectionError("MCP server closed its stdout")
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+
+    async def _dispatch(self, message):
+        if "method" not in message:
+            future = self._pending.get(message.get("id"))
+            if future is None or future.done():
+                return  # late reply to a request that timed out
+            if "error" in message:
+                err = message["error"]
+                future.set_exception(MCPError(err.get("code"), err.get("message"), err.get("data")))
+            else:
+                future.set_result(message.get("result"))
+        elif "id" in message:
+            await self._handle_server_request(message)
+        else:
+            for handler in self._handlers.get(message["method"], []) + self._handlers.get("*", []):
+                try:
+                    handler(message.get("params", {}))
+                except Exception as e:
+                    print(f"⚠️ Notification handler for {message['method']} failed: {e}")
+
+    async def _handle_server_request(self, message):
+        if message["method"] == "ping":
+            reply = {"jsonrpc": "2.0", "id": message["id"], "result": {}}
+        else:
+            reply = {"jsonrpc": "2.0", "id": message["id"],
+                     "error": {"code": -32601, "message": "Method not found"}}
+        await self._send(reply)
+
+    async def _read_stderr(self):
+        async for line in self.process.stderr:
+            print("[MCP SERVER STDERR]", line.decode("utf-8", errors="replace").strip())
+
+    async def close(self):
+        if self.alive:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), 5)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -0,0 +1,182 @@
+# mcp_supervisor.py
+import asyncio
+import os
+import random
+import sys
+
+from mcp_stdio_client import AsyncMCPClient
+
+MIN_BACKOFF = 0.5
+MAX_BACKOFF = 30
+HEALTH_INTERVAL = 30
+HEALTH_TIMEOUT = 5
+MIN_STABLE_UPTIME = 30  # seconds a child must stay up before its failure streak is forgiven
+START_TIMEOUT = 120     # seconds start() waits for the first children to become ready
+
+
+class _Child:
+    def __init__(self, slot):
+        self.slot = slot
+        self.client = None
+        self.ready = False
+        self.restarts = 0
+        self.failures = 0  # consecutive failed starts or early exits, drives the backoff
+
+    def backoff(self):
+        delay = min(MAX_BACKOFF, MIN_BACKOFF * 2 ** (self.failures - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+
+class MCPServerPool:
+    """Keeps ``size`` warm stdio MCP server processes and spreads requests across them.
+
+    Each child joins the rotation only after its ``initialize`` handshake
+    succeeds. Requests go to the ready child with the fewest outstanding
+    requests. A child that exits or stops answering pings is restarted; one
+    that fails to start or exits within MIN_STABLE_UPTIME backs off
+    exponentially, so a server crashing right after its handshake does not
+    respawn in a tight loop. The ``npx`` cold start is paid once per process
+    rather than once per session.
+    """
+
+    def __init__(self, server_cmd, size=None, request_timeout=60, health_interval=HEALTH_INTERVAL):
+        self.server_cmd = server_cmd
+        self.size = size or os.cpu_count() or 1
+        self.request_timeout = request_timeout
+        self.health_interval = health_interval
+        self._children = [_Child(slot) for slot in range(self.size)]
+        self._ready = asyncio.Condition()
+        self._tasks = []
+        self._closing = False
+
+    async def start(self, wait_for=1, timeout=START_TIMEOUT):
+        """Start every child in the background; return once ``wait_for`` of them are ready.
+
+        Raises TimeoutError (after shutting the pool down) if they are not ready within ``timeout``.
+        """
+        self._tasks = [asyncio.create_task(self._supervise(child)) for child in self._children]
+        self._tasks.append(asyncio.create_task(self._health_loop()))
+        try:
+            async with self._ready:
+                await asyncio.wait_for(
+                    self._ready.wait_for(lambda: self.ready_count >= min(wait_for, self.size)), timeout
+                )
+        except asyncio.TimeoutError:
+            await self.close()
+            raise TimeoutError(f"No MCP server became ready within {timeout}s: {' '.join(self.server_cmd)}")
+        return self
+
+    @property
+    def ready_count(self):
+        return sum(1 for child in self._children if child.ready)
+
+    def stats(self):
+        return [
+            {
+                "slot": child.slot,
+                "ready": child.ready,
+                "pid": child.client.process.pid if child.client and child.client.process else None,
+                "outstanding": child.client.outstanding if child.client else 0,
+                "restarts": child.restarts
+            }
+            for child in self._children
+        ]
+
+    async def _supervise(self, child):
+        while not self._closing:
+            client = AsyncMCPClient(self.server_cmd, request_timeout=self.request_timeout)
+            try:
+                await client.start()  # includes the initialize handshake
+            except Exception as e:
+                child.failures += 1
+                delay = child.backoff()
+                print(f"⚠️ MCP server #{child.slot} failed to start ({e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            child.client = client
+            started = asyncio.get_running_loop().time()
+            async with self._ready:
+                child.ready = True
+                self._ready.notify_all()
+
+            await client.process.wait()
+            child.ready = False
+            await client.close()
+            if self._closing:
+                break
+            if asyncio.get_running_loop().time() - started >= MIN_STABLE_UPTIME:
+                child.failures = 0
+            else:
+                child.failures += 1
+            child.restarts += 1
+            delay = child.backoff() if child.failures else 0
+            print(f"⚠️ MCP server #{child.slot} exited with code {client.process.returncode}; "
+                  f"restarting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _health_loop(self):
+        while not self._closing:
+            await asyncio.sleep(self.health_interval)
+            for child in self._children:
+                if not child.ready:
+                    continue
+                try:
+                    await child.client.request("ping", timeout=HEALTH_TIMEOUT)
+                except Exception as e:
+                    print(f"⚠️ MCP server #{child.slot} failed health check ({e}); killing it")
+                    child.ready = False
+                    if child.client.alive:
+                        child.client.process.kill()
+
+    async def _acquire(self):
+        async with self._ready:
+            await asyncio.wait_for(
+                self._ready.wait_for(lambda: self.ready_count > 0),
+                self.request_timeout
+            )
+            ready = [child for child in self._children if child.ready]
+            return min(ready, key=lambda child: child.client.outstanding).client
+
+    async def request(self, method, params=None, timeout=None):
+        client = await self._acquire()
+        return await client.request(method, params, timeout=timeout)
+
+    async def list_tools(self):
+        return (await self.request("tools/list"))["tools"]
+
+    async def call_tool(self, name, arguments=None, timeout=None):
+        return await self.request("tools/call", {"name": name, "arguments": arguments or {}}, timeout=timeout)
+
+    async def close(self):
+        self._closing = True
+        for child in self._children:
+            child.ready = False
+            if child.client:
+                await child.client.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+async def main(root):
+    server_cmd = ['npx', '-y', '@modelcontextprotocol/server-filesystem', root]
+    async with MCPServerPool(server_cmd) as pool:
+        results = await asyncio.gather(
+            *(pool.call_tool('list_directory', {'path': root}) for _ in range(pool.size * 4)),
+            return_exceptions=True
+        )
+        print(f"✅ {sum(not isinstance(r, Exception) for r in results)}/{len(results)} calls succeeded")
+        for stat in pool.stats():
+            print(stat)
+
+
+if __name__ == '__main__':
+    from tenants import get_tenant
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else get_tenant().root))
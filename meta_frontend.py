@@ -6,13 +6,27 @@ import json
 import urllib3
 import traceback
 import re
+import time
+
+import metrics
+from chat_render import prepare_message
+from conversation_store import get_store
+from debug_sink import get_sink
+from extractors import registry as extractor_registry
+from job_service import JobClient
+from llm_router import LLMRouterError, get_router, response_text
+from prefetch import MISS as PREFETCH_MISS, PREFETCH_TOOLS, get_scheduler
+from tenants import PathNotAllowed, tenant_for_user
+from tool_schemas import TOOLS, parse_reply, response_format
+from weather_service import get_weather_service
+from tracing import tracer, format_waterfall
 
 # --- Configuration ---
 DEBUG_MODE = True
+debug_sink = get_sink() if DEBUG_MODE else None
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-API_URL = "https://api.llama.com/v1/chat/completions"
-MODEL = "Llama-4-Maverick-17B-128E-Instruct-FP8"
+llm_router = get_router()
 
 def format_cypher_for_json(cypher_block: str, use_newlines: bool = False) -> str:
     """
@@ -115,10 +129,15 @@ def patch_tool_call(tool_call):
 # Respond in plain text when no tool is needed.
 # """
 
-SYSTEM_PROMPT = """
+# {ROOT} in the prompts is replaced with the tenant's root directory
+ROOT_PLACEHOLDER = "{ROOT}"
+
+# The prompt is assembled from sections so structured-output mode can swap the
+# Cypher and reply-format rules while keeping the task description and examples
+_PROMPT_TASKS = """
 You are a helpful assistant. When appropriate, respond by calling tools using this exact JSON format:
 
-{"tool_call": {"name": "listDir", "arguments": {"path": "/Users/ethancheung/Downloads"}}}
+{"tool_call": {"name": "listDir", "arguments": {"path": "{ROOT}"}}}
 {"tool_call": {"name": "get_weather", "arguments": {"location": "Beijing"}}}
 
 Available tools:
@@ -128,14 +147,25 @@ Available tools:
 - readDocx(path): extract text from Word documents
 - readExcel(path): extract rows from Excel spreadsheets
 - readImageText(path): extract text from images (OCR)
-- get_weather(location): get the current weather conditions for a city or location
+- extractFile(path): extract text from other supported files (.pptx, .html, .eml, .csv)
+- get_weather(location) or get_weather(locations=[...]): get the current weather for one city, or for several in one call
 - saveToNeo4j(cypher): send Cypher statements to Neo4j
 - processPdf(path): process a PDF file using an LLM and load extracted entities/relations into Neo4j
+- queryGraph(template, params, page): answer questions from the Neo4j graph using a read template:
+  - listCategories: categories and file counts
+  - filesByCategory(category): files in a category
+  - piiFiles: files flagged as containing PII
+  - entitiesByFile(file): entities a file mentions
+  - companyRisks(company): risk factors a company faces
+  - companyMetrics(company): financial metrics a company reports
+- askFilings(question): answer a question about processed company filings (10-Ks) from the indexed filing chunks and the knowledge graph
 
 Use these tools to:
-- Read and process files from the Downloads directory.
+- Read and process files from the {ROOT} directory.
 - Categorize documents by type and check for personal or protected information (PII).
 - Answer user questions about the current weather using `get_weather`.
+- Answer questions about files, categories, PII or companies that are already in the graph using `queryGraph` instead of re-reading documents.
+- Answer open questions about the content of filings already loaded with processPdf using `askFilings` instead of reading the PDF again.
 
 Your goals:
 - If the user only asks to view or list directory contents, use listDir and stop there.
@@ -155,7 +185,9 @@ Your goals:
     - If applicable, generate additional `Entity` nodes and `MENTIONS` relationships.
     - Use a unique variable for each node, such as `f1`, `c1`, `f2`, `c2`, etc.
 
-When generating Cypher code:
+"""
+
+_PROMPT_RULES = """When generating Cypher code:
 - Wrap raw Cypher code intended for saveToNeo4j in ****** CYPHER BLOCK START ****** and ****** CYPHER BLOCK END ****** markers.
 - Always use `MERGE` instead of `CREATE` to avoid duplicates.
 - Use `MERGE (fX:File {name: ...})` and then `SET fX.category = ..., fX.pii_flag = ..., fX.summary = ...`.
@@ -183,17 +215,69 @@ Only proceed to this final tool_call after all files have been processed. You do
 
 If a file cannot be processed (e.g., unsupported format), skip it and continue.
 
-Example tool usages:
-{"tool_call": {"name": "readPDF", "arguments": {"path": "/Users/ethancheung/Downloads/file.pdf"}}}
-{"tool_call": {"name": "processPdf", "arguments": {"path": "/Users/ethancheung/Downloads/10k.pdf"}}}
-{"tool_call": {"name": "readDocx", "arguments": {"path": "/Users/ethancheung/Downloads/resume.docx"}}}
-{"tool_call": {"name": "readExcel", "arguments": {"path": "/Users/ethancheung/Downloads/license.xlsx"}}}
+"""
+
+_PROMPT_EXAMPLES = """Example tool usages:
+{"tool_call": {"name": "readPDF", "arguments": {"path": "{ROOT}/file.pdf"}}}
+{"tool_call": {"name": "processPdf", "arguments": {"path": "{ROOT}/10k.pdf"}}}
+{"tool_call": {"name": "readDocx", "arguments": {"path": "{ROOT}/resume.docx"}}}
+{"tool_call": {"name": "readExcel", "arguments": {"path": "{ROOT}/license.xlsx"}}}
 {"tool_call": {"name": "get_weather", "arguments": {"location": "Beijing"}}}
+{"tool_call": {"name": "get_weather", "arguments": {"locations": ["Beijing", "Tokyo", "Paris, FR"]}}}
+{"tool_call": {"name": "queryGraph", "arguments": {"template": "piiFiles", "params": {}}}}
+{"tool_call": {"name": "queryGraph", "arguments": {"template": "companyRisks", "params": {"company": "Apple"}, "page": 2}}}
+{"tool_call": {"name": "askFilings", "arguments": {"question": "What supply chain risks does Apple report?"}}}
+"""
+
+SYSTEM_PROMPT = _PROMPT_TASKS + _PROMPT_RULES + _PROMPT_EXAMPLES
+
+# Structured-output mode enforces the reply shape with tool_schemas.REPLY_SCHEMA, so the
+# marker, backtick and escaping rules of SYSTEM_PROMPT give way to a description of the schema
+_STRUCTURED_PROMPT_RULES = """When generating Cypher code:
+- Always use `MERGE` instead of `CREATE` to avoid duplicates.
+- Use `MERGE (fX:File {name: ...})` and then `SET fX.category = ..., fX.pii_flag = ..., fX.summary = ...`.
+- Do not reuse the same variable name (`f`, `c`, etc.) more than once in the same query.
+- Group all related statements together in one query and send it in a **single tool_call to `saveToNeo4j`**.
+- In Cypher string literals, escape a single quote by doubling it: 'Alice''s file'.
+
+Every reply is one JSON object matching the response schema:
+- To call a tool: {"tool_call": {"name": "<tool name>", "arguments": {...}}}
+- To answer in prose: {"text": "<your answer>"}
+
+Only proceed to the final saveToNeo4j tool_call after all files have been processed. You do not need to wait for tool responses in between.
+
+If a file cannot be processed (e.g., unsupported format), skip it and continue.
+
 """
 
+STRUCTURED_SYSTEM_PROMPT = _PROMPT_TASKS + _STRUCTURED_PROMPT_RULES + _PROMPT_EXAMPLES
+
 
 
 MAX_CONVERSATION_TURNS = 10
+# Constrain replies to a JSON Schema and validate them once instead of repairing free-form output
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "1") == "1"
+MAX_REPROMPTS = 2
+MAX_TRACES = 20  # per-session turn traces kept for the debug waterfall
+HISTORY_PAGE_SIZE = 30  # messages rendered per "load earlier" step
+# Turns that categorize documents or check them for PII use the router's "classify" route
+CLASSIFY_PROMPT_RE = re.compile(r"\b(categori[sz]\w*|classif\w*|pii|personal information)\b", re.IGNORECASE)
+# Draw only the new turn's messages instead of rerunning the whole script after each reply,
+# and collapse large tool output behind a toggle that renders it only when opened
+INCREMENTAL_RENDERING = os.getenv("INCREMENTAL_RENDERING", "1") == "1"
+
+# Conversations live in a shared SQLite log rather than in session state, so any replica can serve them
+conversation_store = get_store()
+
+metrics.start_http_server()
+
+# Long-running tools go to the job service when it is configured, so they survive UI reruns
+JOB_SERVICE_URL = os.getenv("JOB_SERVICE_URL")
+BACKGROUND_TOOLS = {"processPdf", "saveToNeo4j"}
+job_client = JobClient(JOB_SERVICE_URL) if JOB_SERVICE_URL else None
+
+# Warms read-tool results for listed files while the model is still working through them
+prefetcher = get_scheduler()
 
 # --- MCP Tool Client ---
 class MCPHttpClient:
@@ -209,323 +293,286 @@ class MCPHttpClient:
             "method": method,
             "params": params or {}
         }
-        response = requests.post(self.url, json=payload)
+        with tracer.span("mcp.request", **{"rpc.method": method}) as span:
+            started = time.perf_counter()
+            try:
+                response = requests.post(self.url, json=payload)
+            except requests.exceptions.RequestException:
+                metrics.TOOL_CALL_SECONDS.labels(tool=method, status="error").observe(time.perf_counter() - started)
+                raise
+            span.set("request.bytes", len(response.request.body or b""))
+            span.set("response.bytes", len(response.content))
 
-        if DEBUG_MODE:
-            st.subheader("📤 Sent MCP request")
-            st.json(payload)
+            if DEBUG_MODE:
+                debug_sink.record("mcp.request", payload, method=method)
 
-            st.subheader("📥 Received MCP response")
             try:
-                st.json(response.json())  # ✅ This is what you want to log
+                response.raise_for_status()
+                result = response.json()
             except Exception as e:
-                st.error("⚠️ Could not parse response JSON")
-                st.text(response.text)
-
-        response.raise_for_status()
-        result = response.json()
-        if 'error' in result:
-            raise Exception(f"[{result['error']['code']}] {result['error']['message']}")
-        return result['result']
+                if DEBUG_MODE:
+                    debug_sink.record("mcp.response", response.text, level="error", method=method, error=str(e))
+                raise
+            if DEBUG_MODE:
+                debug_sink.record("mcp.response", result, method=method)
+            status = "error" if 'error' in result else "ok"
+            metrics.TOOL_CALL_SECONDS.labels(tool=method, status=status).observe(time.perf_counter() - started)
+            if 'error' in result:
+                span.set("rpc.error_code", result['error']['code'])
+                metrics.JSONRPC_ERRORS.labels(method=method, code=result['error']['code']).inc()
+                raise Exception(f"[{result['error']['code']}] {result['error']['message']}")
+            return result['result']
 
 
 mcp_client = MCPHttpClient("http://localhost:8090/mcp")
 
 # --- Get API key ---
-api_key = os.getenv("LLAMA_API_KEY")
-if not api_key:
-    st.error("\U0001F6A8 Missing LLAMA_API_KEY environment variable.")
-    st.warning("Please set the LLAMA_API_KEY environment variable and restart.")
+if not llm_router.candidates("chat"):
+    st.error("\U0001F6A8 Missing LLAMA_API_KEY / OPENAI_API_KEY environment variable.")
+    st.warning("Please set LLAMA_API_KEY (or OPENAI_API_KEY for the fallback model) and restart.")
     st.stop()
 
-# --- Initialize session state ---
-if "conversation_history" not in st.session_state:
-    st.session_state.conversation_history = []
+# --- Tenant: selects the root directory tools may touch and the quotas this session runs under ---
+# Taken from the signed-in user (tenants.json "users") or the deployment's TENANT, never from the URL
+user = getattr(st, "user", None) or getattr(st, "experimental_user", None)
+try:
+    tenant = tenant_for_user(user.get("email") if user is not None else None)
+except (KeyError, PermissionError) as e:
+    st.error(f"\U0001F6A8 {e.args[0]}")
+    st.stop()
+# --- Conversation: the id lives in the URL, the messages in conversation_store ---
+conversation_id = st.query_params.get("c")
+if not conversation_id:
+    conversation_id = conversation_store.new_conversation_id()
+    st.query_params["c"] = conversation_id
+if conversation_store.bind_tenant(conversation_id, tenant.id) != tenant.id:
+    st.error("\U0001F6A8 This conversation belongs to another tenant.")
+    st.stop()
+if "history_pages" not in st.session_state:
+    st.session_state.history_pages = 1
 
 # --- UI ---
 st.title("\U0001F9E0 Llama Chat")
-st.caption(f"Using model: {MODEL}")
+st.caption("Using model: " + " → ".join(b.model for b in llm_router.candidates("chat")))
 if DEBUG_MODE:
-    st.caption(f"API Endpoint: {API_URL}")
+    st.caption("LLM backends: " + ", ".join(
+        f"{b['backend']} ({b['latency_ewma']['chat']}s{'' if b['available'] else ', cooling down'})"
+        for b in llm_router.stats()
+    ))
     st.caption("\U0001F41E DEBUG MODE IS ON")
 
+def render_message(message):
+    if not INCREMENTAL_RENDERING:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+        return
+    rendered = prepare_message(conversation_id, message)
+    with st.chat_message(rendered.role):
+        if rendered.summary is None:
+            st.markdown(rendered.body)
+        elif st.toggle(rendered.summary, key=f"expand-{conversation_id}-{message['seq']}"):
+            st.markdown(rendered.body)
+
+
+def render_new_messages():
+    """Draw messages stored since the last render into the chat container."""
+    global last_rendered_seq
+    with chat_container:
+        for message in conversation_store.since(conversation_id, last_rendered_seq):
+            if message.get("role") and message.get("content"):
+                render_message(message)
+            last_rendered_seq = message["seq"]
+
+
 chat_container = st.container()
 with chat_container:
-    for message_dict in st.session_state.conversation_history:
-        role = message_dict.get("role")
-        content = message_dict.get("content", "[No content found]")
-        if role and content:
-            with st.chat_message(role):
-                st.markdown(content)
+    # Only the newest pages are loaded; older messages are fetched on request
+    visible_history = conversation_store.page(
+        conversation_id, limit=HISTORY_PAGE_SIZE * st.session_state.history_pages
+    )
+    if visible_history and visible_history[0]["seq"] > 1:
+        if st.button(f"⬆️ Load earlier messages ({visible_history[0]['seq'] - 1} more)"):
+            st.session_state.history_pages += 1
+            st.rerun()
+    for message_dict in visible_history:
+        if message_dict.get("role") and message_dict.get("content"):
+            render_message(message_dict)
+    last_rendered_seq = visible_history[-1]["seq"] if visible_history else 0
+
+pending_jobs = conversation_store.pending_jobs(conversation_id) if job_client is not None else []
+if pending_jobs:
+    with st.expander("⏳ Background jobs", expanded=True):
+        for job_ref in pending_jobs:
+            try:
+                job = job_client.get(job_ref["id"])
+            except requests.exceptions.RequestException as e:
+                st.warning(f"`{job_ref['tool']}` job `{job_ref['id']}`: status unavailable ({e})")
+                continue
+            col_status, col_action = st.columns([4, 1])
+            col_status.write(f"`{job_ref['tool']}` job `{job['id'][:8]}`: **{job['status']}**")
+            if job["status"] in ("queued", "running"):
+                if col_action.button("Cancel", key=f"cancel-{job['id']}"):
+                    job_client.cancel(job["id"])
+                    st.rerun()
+            elif conversation_store.mark_job_reported(conversation_id, job_ref["id"]):
+                # Post each finished job into the chat exactly once
+                if job["status"] == "done":
+                    content = f"✅ `{job_ref['tool']}` result:\n\n{json.dumps(job['result'], indent=2)}"
+                else:
+                    content = f"❌ `{job_ref['tool']}` job {job['status']}: {job.get('error') or ''}"
+                conversation_store.append(conversation_id, {"role": "assistant", "content": content})
+                st.rerun()
+        if st.button("Refresh jobs"):
+            st.rerun()
 
 if prompt := st.chat_input("What would you like to ask?"):
     user_message = {"role": "user", "content": prompt}
-    st.session_state.conversation_history.append(user_message)
-
-    history_to_send = st.session_state.conversation_history[-(MAX_CONVERSATION_TURNS * 2):]
-    messages_payload = [{"role": "system", "content": SYSTEM_PROMPT}] + history_to_send
-
-    tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "listDir",
-                "description": "List files in a directory.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "Directory path to list"
-                        }
-                    },
-                    "required": ["path"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "readTextFile",
-                "description": "Read plain text files.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "Path to the .txt file"
-                        }
-                    },
-                    "required": ["path"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "readPDF",
-                "description": "Extract text from PDF files.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "Path to the PDF file"
-                        }
-                    },
-                    "required": ["path"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "readDocx",
-                "description": "Extract text from Word documents (.docx).",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "Path to the DOCX file"
-                        }
-                    },
-                    "required": ["path"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "readExcel",
-                "description": "Extract rows from Excel spreadsheets.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "Path to the Excel file"
-                        }
-                    },
-                    "required": ["path"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "readImageText",
-                "description": "Extract text from images using OCR.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "Path to the image file"
-                        }
-                    },
-                    "required": ["path"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "get_weather",
-                "description": "Get the current weather conditions for a location.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "location": {
-                            "type": "string",
-                            "description": "The city or location to get the weather for"
-                        }
-                    },
-                    "required": ["location"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "saveToNeo4j",
-                "description": "Send Cypher statements to Neo4j.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "cypher": {
-                            "type": "string",
-                            "description": "The full Cypher query to execute."
-                        }
-                    },
-                    "required": ["cypher"]
-                }
-            }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "processPdf",
-                "description": "Process a PDF file into Neo4j using the GraphRAG pipeline.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "Full path to the PDF file to process."
-                        }
-                    },
-                    "required": ["path"]
-                }
-            }
-        }
-    ]
+    conversation_store.append(conversation_id, user_message)
+    if INCREMENTAL_RENDERING:
+        render_new_messages()
+
+    history_to_send = conversation_store.recent(conversation_id, MAX_CONVERSATION_TURNS * 2)
+    system_prompt = STRUCTURED_SYSTEM_PROMPT if STRUCTURED_OUTPUT else SYSTEM_PROMPT
+    system_prompt = system_prompt.replace(ROOT_PLACEHOLDER, tenant.root)
+    messages_payload = [{"role": "system", "content": system_prompt}] + history_to_send
+
 
     payload = {
-        "model": MODEL,
         "messages": messages_payload,
         "max_tokens": 512,
-        "tool_choice": "auto",
-        "tools": tools  # use the full list above
     }
+    if STRUCTURED_OUTPUT:
+        payload["response_format"] = response_format()
+    else:
+        payload.update({"tool_choice": "auto", "tools": TOOLS})
 
 
 
     if DEBUG_MODE:
-        st.warning("\U0001F41E DEBUG: Sending Payload to API:")
-        try:
-            st.json(payload)
-        except Exception as json_err:
-            st.error(f"Error displaying payload as JSON: {json_err}")
-            st.text(str(payload))
+        debug_sink.record("llm.request", payload)
 
+    llm_task = "classify" if CLASSIFY_PROMPT_RE.search(prompt) else "chat"
+    turn_span = tracer.start_span("chat.turn", **{"history.messages": len(history_to_send)})
+    background_job = None
     try:
-        with st.spinner("Llama is thinking..."):
-            response = requests.post(
-                API_URL,
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json=payload,
-                verify=False,
-                timeout=180
-            )
+        with st.spinner("Llama is thinking..."), tracer.span("llm.request", task=llm_task) as llm_span, \
+                tenant.limit("llm"):
+            result, backend = llm_router.complete(llm_task, **payload)
+            llm_span.set("llm.backend", backend.name)
+            llm_span.set("llm.model", backend.model)
             if DEBUG_MODE:
-                st.info(f"\U0001F41E DEBUG: API Response Status Code: {response.status_code}")
-            response.raise_for_status()
-            result = response.json()
+                st.info(f"\U0001F41E DEBUG: Answered by {backend.name} ({backend.model})")
+            for metric in result.get("metrics", []):
+                # e.g. num_prompt_tokens, num_completion_tokens, num_total_tokens
+                llm_span.set(f"llm.{metric.get('metric')}", metric.get("value"))
 
         if DEBUG_MODE:
-            st.info("\U0001F41E DEBUG: Raw API Response JSON:")
-            st.json(result)
+            debug_sink.record("llm.response", result)
+
+        if STRUCTURED_OUTPUT:
+            reply, reply_errors = parse_reply(response_text(result))
+            for attempt in range(1, MAX_REPROMPTS + 1):
+                if not reply_errors:
+                    break
+                metrics.LLM_REPROMPTS.labels(backend=backend.name).inc()
+                if DEBUG_MODE:
+                    debug_sink.record("llm.invalid_reply", response_text(result), errors=reply_errors)
+                retry_messages = payload["messages"] + [
+                    {"role": "assistant", "content": response_text(result)},
+                    {"role": "user", "content": (
+                        "Your reply did not match the response schema:\n"
+                        + "\n".join(f"- {error}" for error in reply_errors)
+                        + "\nReply again with a single valid JSON object."
+                    )}
+                ]
+                with st.spinner("Re-asking for a valid reply..."), tracer.span("llm.reprompt", attempt=attempt), \
+                        tenant.limit("llm"):
+                    result, backend = llm_router.complete(llm_task, **{**payload, "messages": retry_messages})
+                reply, reply_errors = parse_reply(response_text(result))
 
         completion_message = result.get("completion_message", {})
         if not completion_message:
             st.error("⚠️ Empty response from model. Please try again or rephrase your request.")
             st.stop()
-        content_data = completion_message.get("content", {})
-        tool_call = completion_message.get("tool_call")
-        assistant_content = "[No assistant response generated]"
-
-        if tool_call:
-            tool_call = patch_tool_call(tool_call)
-            tool_name = tool_call.get("name")
-            tool_args = tool_call.get("arguments", {})
-        if tool_call:
-            # process the tool call...
-            assistant_content = f"✅ Tool `{tool_call['name']}` executed."
-        elif isinstance(content_data, dict):
-            assistant_content = content_data.get("text", "").strip()
-        elif isinstance(content_data, str):
-            assistant_content = content_data.strip()
-
-        # Normalize content and attempt to extract tool_call from content string
-        content_text = ""
-        if isinstance(content_data, dict):
-            content_text = content_data.get("text", "").strip()
-        elif isinstance(content_data, str):
-            content_text = content_data.strip()
+        parse_span = tracer.start_span("parse.tool_call")
+        if STRUCTURED_OUTPUT:
+            # Validated against REPLY_SCHEMA above, so no repair pass is needed
+            assistant_content = "[No assistant response generated]"
+            if reply_errors:
+                tool_call = None
+                content_data = {"text": "❌ Model reply did not match the response schema:\n" + "\n".join(
+                    f"- {error}" for error in reply_errors
+                )}
+            else:
+                tool_call = reply.get("tool_call")
+                content_data = {"text": reply.get("text", "")}
         else:
-            content_text = str(content_data)
+            content_data = completion_message.get("content", {})
+            tool_call = completion_message.get("tool_call")
+            assistant_content = "[No assistant response generated]"
 
-        if not tool_call:
-            try:
-                parsed = json.loads(content_text)
-                if isinstance(parsed, dict) and "tool_call" in parsed:
-                    tool_call = parsed["tool_call"]
+            if tool_call:
+                tool_call = patch_tool_call(tool_call)
+                tool_name = tool_call.get("name")
+                tool_args = tool_call.get("arguments", {})
+            if tool_call:
+                # process the tool call...
+                assistant_content = f"✅ Tool `{tool_call['name']}` executed."
+            elif isinstance(content_data, dict):
+                assistant_content = content_data.get("text", "").strip()
+            elif isinstance(content_data, str):
+                assistant_content = content_data.strip()
+
+            # Normalize content and attempt to extract tool_call from content string
+            content_text = ""
+            if isinstance(content_data, dict):
+                content_text = content_data.get("text", "").strip()
+            elif isinstance(content_data, str):
+                content_text = content_data.strip()
+            else:
+                content_text = str(content_data)
+
+            if not tool_call:
+                try:
+                    parsed = json.loads(content_text)
+                    if isinstance(parsed, dict) and "tool_call" in parsed:
+                        tool_call = parsed["tool_call"]
+                        if DEBUG_MODE:
+                            st.info("🛠 Parsed tool_call from stringified JSON:")
+                            st.json(tool_call)
+                except Exception as parse_err:
                     if DEBUG_MODE:
-                        st.info("🛠 Parsed tool_call from stringified JSON:")
-                        st.json(tool_call)
-            except Exception as parse_err:
-                if DEBUG_MODE:
-                    st.warning("⚠️ Could not parse tool_call from content:")
-                    st.code(str(parse_err))
-        # Fallback: Look for a Cypher block delimited by custom markers
-        if not tool_call:
-            cypher_match = re.search(
-                r"\*+.*?CYPHER BLOCK START.*?\*+\s*(.*?)\s*\*+.*?CYPHER BLOCK END.*?\*+",
-                content_text,
-                re.DOTALL | re.IGNORECASE
-            )
-            if cypher_match:
-                cypher_raw = cypher_match.group(1).strip()
-                cypher_raw = re.sub(r"''{2,}", "''", cypher_raw)
-                cypher_raw = cypher_raw.encode('utf-8').decode('unicode_escape')  # <--- this line
-                cypher_raw = "MATCH (n) DETACH DELETE n\n" + cypher_raw
-
-
-                tool_call = {
-                    "name": "saveToNeo4j",
-                    "arguments": {"cypher": cypher_raw}
-                }
+                        st.warning("⚠️ Could not parse tool_call from content:")
+                        st.code(str(parse_err))
+            # Fallback: Look for a Cypher block delimited by custom markers
+            if not tool_call:
+                cypher_match = re.search(
+                    r"\*+.*?CYPHER BLOCK START.*?\*+\s*(.*?)\s*\*+.*?CYPHER BLOCK END.*?\*+",
+                    content_text,
+                    re.DOTALL | re.IGNORECASE
+                )
+                if cypher_match:
+                    cypher_raw = cypher_match.group(1).strip()
+                    cypher_raw = re.sub(r"''{2,}", "''", cypher_raw)
+                    cypher_raw = cypher_raw.encode('utf-8').decode('unicode_escape')  # <--- this line
+                    cypher_raw = "MATCH (n) DETACH DELETE n\n" + cypher_raw
+
+
+                    tool_call = {
+                        "name": "saveToNeo4j",
+                        "arguments": {"cypher": cypher_raw}
+                    }
+                    parse_span.set("parse.fallback", "cypher_block")
 
-                if DEBUG_MODE:
-                    st.success("✅ Extracted Cypher from CYPHER BLOCK delimiters")
-                    st.code(cypher_raw, language="cypher")
+                    if DEBUG_MODE:
+                        st.success("✅ Extracted Cypher from CYPHER BLOCK delimiters")
+                        st.code(cypher_raw, language="cypher")
 
-                print("CYPHER RAW *************** ", cypher_raw, "****************************")
+                    print("CYPHER RAW *************** ", cypher_raw, "****************************")
 
+        tracer.end_span(parse_span)
+        if tool_call:
+            turn_span.set("tool.name", tool_call.get("name", ""))
         print("TOOL CALL *************** ",tool_call,"****************************")
         if tool_call:
             tool_name = tool_call.get("name")
@@ -538,10 +585,47 @@ if prompt := st.chat_input("What would you like to ask?"):
                 # tool_result = mcp_client.send_request(tool_name, tool_args)
                 tool_name = tool_call.get("name", "").strip()
                 tool_args = tool_call.get("arguments", {})
-                tool_result = mcp_client.send_request(tool_name, tool_args)
+                if "path" in tool_args:
+                    # Every file tool is sandboxed to the tenant root; relative paths start there
+                    tool_args["path"] = tenant.resolve(tool_args["path"])
+                background_job = None
+                if job_client is not None and tool_name == "processPdf":
+                    # Runs the pipeline inside the job service, whose /metrics records the ingestion
+                    background_job = job_client.submit("process_pdf", {"path": tool_args["path"]}, tenant=tenant.id)
+                    conversation_store.add_job(conversation_id, background_job, tool_name)
+                    tool_result = {"job_id": background_job, "status": "queued"}
+                elif job_client is not None and tool_name in BACKGROUND_TOOLS:
+                    background_job = job_client.submit(
+                        "mcp_tool", {"tool": tool_name, "arguments": tool_args}, tenant=tenant.id
+                    )
+                    conversation_store.add_job(conversation_id, background_job, tool_name)
+                    tool_result = {"job_id": background_job, "status": "queued"}
+                elif tool_name in PREFETCH_TOOLS and (
+                    cached := prefetcher.get(tool_name, tool_args.get("path", ""))
+                ) is not PREFETCH_MISS:
+                    tool_result = cached
+                elif tool_name in extractor_registry.tools():
+                    # The registry picks the extractor (and its worker pool) from the file type
+                    with prefetcher.foreground(), tenant.limit("extraction"):
+                        tool_result = extractor_registry.extract(tool_args.get("path", ""), timeout=180)
+                elif tool_name == "get_weather":
+                    # Served from the shared weather cache rather than a fresh MCP round trip
+                    if tool_args.get("locations"):
+                        tool_result = get_weather_service().lookup_many(tool_args["locations"])
+                    else:
+                        tool_result = get_weather_service().lookup(tool_args.get("location", ""))
+                else:
+                    with prefetcher.foreground():
+                        tool_result = mcp_client.send_request(tool_name, tool_args)
                 # Optional: special postprocessing for known tools
-                if tool_name == "saveToNeo4j":
-                    tool_call = patch_tool_call(tool_call)
+                if background_job:
+                    st.info(f"⏳ `{tool_name}` queued as background job `{background_job}`")
+                elif tool_name == "saveToNeo4j":
+                    if not STRUCTURED_OUTPUT:
+                        tool_call = patch_tool_call(tool_call)
+                    metrics.CYPHER_STATEMENTS.labels(source="agent").inc()
+                    if isinstance(tool_result, dict):
+                        metrics.record_neo4j_summary(tool_result.get("summary"))
 
                     st.success("✅ Cypher query sent to Neo4j!")
                     st.json(tool_result)
@@ -553,19 +637,12 @@ if prompt := st.chat_input("What would you like to ask?"):
 
                 if tool_name == "listDir" and isinstance(tool_result, list):
                     file_tool_calls = []
+                    unsupported_files = []
                     for filename in tool_result:
-                        path = f"/Users/ethancheung/Downloads/{filename}"
-                        if filename.endswith(".pdf"):
-                            tool = "readPDF"
-                        elif filename.endswith(".docx"):
-                            tool = "readDocx"
-                        elif filename.endswith(".xlsx"):
-                            tool = "readExcel"
-                        elif filename.endswith(".txt"):
-                            tool = "readTextFile"
-                        elif filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                            tool = "readImageText"
-                        else:
+                        path = os.path.join(tool_args.get("path", tenant.root), filename)
+                        tool = extractor_registry.tool_for(path)
+                        if tool is None:
+                            unsupported_files.append(filename)
                             continue
                         file_tool_calls.append({"tool_call": {"name": tool, "arguments": {"path": path}}})
                     assistant_content = (
@@ -573,24 +650,34 @@ if prompt := st.chat_input("What would you like to ask?"):
                         f"{json.dumps(tool_result, indent=2)}\n\n"
                         f"Ready to analyze each file: {len(file_tool_calls)} tool calls planned."
                     )
+                    if unsupported_files:
+                        assistant_content += (
+                            f"\n\nSkipped {len(unsupported_files)} file(s) with no extractor: "
+                            + ", ".join(unsupported_files)
+                        )
                     for call in file_tool_calls:
-                        st.session_state.conversation_history.append({"role": "user", "content": json.dumps(call)})
-                elif tool_name == "saveToNeo4j":
+                        conversation_store.append(conversation_id, {"role": "user", "content": json.dumps(call)})
+                    prefetcher.schedule([
+                        (call["tool_call"]["name"], call["tool_call"]["arguments"]["path"])
+                        for call in file_tool_calls
+                    ], tenant=tenant, session=conversation_id)
+                elif tool_name == "saveToNeo4j" and background_job is None:
                     cypher = tool_args.get("cypher", "")
                     if not cypher:
                         st.warning("⚠️ No Cypher code provided.")
                         st.stop()
                     if DEBUG_MODE:
                         st.code(cypher, language="cypher")
-                    response = requests.post(
-                        "http://localhost:8090/mcp",
-                        json={
-                            "jsonrpc": "2.0",
-                            "method": "saveToNeo4j",
-                            "params": {"cypher": cypher},
-                            "id": 1
-                        }
-                    )
+                    with tracer.span("neo4j.write", **{"cypher.bytes": len(cypher)}):
+                        response = requests.post(
+                            "http://localhost:8090/mcp",
+                            json={
+                                "jsonrpc": "2.0",
+                                "method": "saveToNeo4j",
+                                "params": {"cypher": cypher},
+                                "id": 1
+                            }
+                        )
                     if response.ok:
                         st.success("✅ Cypher saved to Neo4j")
                         st.json(response.json())
@@ -603,6 +690,8 @@ if prompt := st.chat_input("What would you like to ask?"):
                         f"✅ `{tool_name}` result:\n\n"
                         f"{json.dumps(tool_result, indent=2)}"
                     )
+            except PathNotAllowed as path_err:
+                assistant_content = f"❌ Tool call refused: {path_err}"
             except Exception as tool_err:
                 assistant_content = f"❌ Tool call error: {tool_err}"
         else:
@@ -619,33 +708,66 @@ if prompt := st.chat_input("What would you like to ask?"):
             "stop_reason": completion_message.get("stop_reason", "tool_or_response")
         }
 
-        st.session_state.conversation_history.append(assistant_message_dict)
-        st.rerun()
+        conversation_store.append(conversation_id, assistant_message_dict)
+        conversation_store.compact(conversation_id)
+        if INCREMENTAL_RENDERING and background_job is None:
+            render_new_messages()
+        else:
+            # A new background job has to appear in the jobs panel above, which needs a full rerun
+            st.rerun()
+
+    except LLMRouterError as router_err:
+        turn_span.set_error(router_err)
+        st.error(f"LLM Error: {router_err}")
 
     except requests.exceptions.HTTPError as http_err:
+        turn_span.set_error(http_err)
         st.error(f"HTTP Error Occurred: {http_err}")
         if DEBUG_MODE and http_err.response is not None:
-            try:
-                error_details = http_err.response.json()
-                st.error("\U0001F41E DEBUG: Detailed API Error Response (JSON):")
-                st.json(error_details)
-            except json.JSONDecodeError:
-                st.error("\U0001F41E DEBUG: Raw API Error Response Text:")
-                st.code(http_err.response.text)
+            debug_sink.record("llm.error", http_err.response.text, level="error",
+                              status=http_err.response.status_code)
+            st.error("\U0001F41E DEBUG: API error response written to the debug log")
 
     except requests.exceptions.RequestException as e:
+        turn_span.set_error(e)
         st.error(f"API Request Error: {e}")
         if DEBUG_MODE and hasattr(e, 'response') and e.response is not None:
             st.error(f"Status Code: {e.response.status_code}")
             st.error(f"Response Text: {e.response.text}")
 
     except Exception as e:
+        turn_span.set_error(e)
         st.error(f"An unexpected error occurred: {e}")
         if DEBUG_MODE:
             st.error("Traceback:")
             st.code(traceback.format_exc())
 
+    finally:
+        # Also runs when st.rerun()/st.stop() end the script early
+        tracer.end_span(turn_span)
+        traces = st.session_state.get("traces", []) + [turn_span.trace]
+        st.session_state.traces = traces[-MAX_TRACES:]
+
+if DEBUG_MODE:
+    with st.expander("🪵 Debug log"):
+        kind = st.selectbox(
+            "Record kind",
+            ["all", "llm.request", "llm.response", "llm.error", "mcp.request", "mcp.response"]
+        )
+        limit = st.number_input("Records", min_value=1, max_value=500, value=20)
+        # Read from disk only when asked, so normal reruns pay nothing for the log
+        if st.button("Load debug log"):
+            for entry in debug_sink.read_recent(limit=int(limit), kind=None if kind == "all" else kind):
+                st.json(entry, expanded=False)
+
+if DEBUG_MODE and st.session_state.get("traces"):
+    with st.expander("⏱️ Turn timings (this session)"):
+        for trace in reversed(st.session_state.traces):
+            st.code(format_waterfall(trace))
+
 st.divider()
 if st.button("Clear Conversation History"):
-    st.session_state.conversation_history = []
+    # The old log is kept; the session simply moves to a new conversation
+    st.query_params["c"] = conversation_store.new_conversation_id()
+    st.session_state.history_pages = 1
     st.rerun()
@@ -0,0 +1,284 @@
+# metrics.py
+import math
+import os
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+# Short-lived runs (batch ingestion, one-off OCR) push here on exit, since nothing scrapes them in time
+PUSHGATEWAY_URL = os.getenv("PUSHGATEWAY_URL")
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple((name, str(labels.get(name, ""))) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+        return child
+
+    def _default(self):
+        # Unlabelled metrics act as their own single child
+        return self.labels()
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            lines.extend(child.samples(self.name, key))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self._value += amount
+
+    def samples(self, name, key):
+        return [f"{name}_total{_format_labels(key)} {_format_value(self._value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+    _new_child = staticmethod(_CounterChild)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        self._value += amount
+
+    def dec(self, amount=1):
+        self._value -= amount
+
+    def samples(self, name, key):
+        return [f"{name}{_format_labels(key)} {_format_value(self._value)}"]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+    _new_child = staticmethod(_GaugeChild)
+
+    def set(self, value):
+        self._default().set(value)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._sum += value
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name, key):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._buckets, counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(key + (('le', _format_value(bound)),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(key)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Streamlit re-executes scripts; hand back the existing metric instead of duplicating it
+            return self._metrics.setdefault(metric.name, metric)
+
+    def expose(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# --- Agent and ingestion metrics ---
+LLM_REQUEST_SECONDS = histogram("llm_request_seconds", "LLM chat completion latency", ["model", "status"])
+LLM_TOKENS = counter("llm_tokens", "LLM tokens consumed", ["model", "kind"])
+LLM_BACKEND_LATENCY = gauge("llm_backend_latency_ewma_seconds", "Smoothed LLM latency per backend and task", ["backend", "task"])
+LLM_REPROMPTS = counter("llm_reprompts", "Structured replies re-requested after failing schema validation", ["backend"])
+LLM_FAILOVERS = counter("llm_failovers", "LLM calls that failed over to the next backend", ["task", "backend"])
+TOOL_CALL_SECONDS = histogram("tool_call_seconds", "MCP tool call latency", ["tool", "status"])
+JSONRPC_ERRORS = counter("jsonrpc_errors", "JSON-RPC error responses", ["method", "code"])
+CYPHER_STATEMENTS = counter("cypher_statements", "Cypher statements sent to Neo4j", ["source"])
+NEO4J_WRITES = counter("neo4j_writes", "Nodes, relationships and properties written to Neo4j", ["kind"])
+EXTRACTION_BYTES = counter("extraction_bytes", "Bytes of input files extracted", ["extractor"])
+EXTRACTION_SECONDS = histogram("extraction_seconds", "Time spent extracting one file", ["extractor", "status"])
+CACHE_REQUESTS = counter("cache_requests", "Cache lookups by outcome", ["cache", "result"])
+INGESTED_FILES = counter("ingested_files", "Files run through the KG ingestion pipeline", ["status"])
+INGESTION_SECONDS = histogram("ingestion_seconds", "KG pipeline time per file", ["status"])
+
+# neo4j-driver ResultSummary counter names -> NEO4J_WRITES kind label
+_NEO4J_COUNTER_KINDS = {
+    "nodesCreated": "nodes_created",
+    "nodesDeleted": "nodes_deleted",
+    "relationshipsCreated": "relationships_created",
+    "relationshipsDeleted": "relationships_deleted",
+    "propertiesSet": "properties_set",
+    "labelsAdded": "labels_added",
+}
+
+
+def record_neo4j_summary(summary):
+    """Count writes from a serialized neo4j-driver ResultSummary (as returned by saveToNeo4j)."""
+    stats = ((summary or {}).get("counters") or {}).get("_stats") or {}
+    for name, kind in _NEO4J_COUNTER_KINDS.items():
+        if stats.get(name):
+            NEO4J_WRITES.labels(kind=kind).inc(stats[name])
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.expose().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood the console
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port=METRICS_PORT, addr="127.0.0.1"):
+    """Serve /metrics on a daemon thread; later calls are no-ops."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+            except OSError as e:
+                print(f"⚠️ Metrics endpoint not started on {addr}:{port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
+
+
+def push_to_gateway(job, url=PUSHGATEWAY_URL):
+    """Replace the Pushgateway's metrics for ``job`` with this process's; a no-op without PUSHGATEWAY_URL."""
+    if not url:
+        return False
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/metrics/job/{job}",
+        data=REGISTRY.expose().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4"},
+        method="PUT"
+    )
+    try:
+        urllib.request.urlopen(request, timeout=10).close()
+    except OSError as e:
+        # stderr: some callers' stdout is parsed by the MCP server
+        print(f"⚠️ Metrics not pushed to {url}: {e}", file=sys.stderr)
+        return False
+    return True
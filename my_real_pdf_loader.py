@@ -3,15 +3,28 @@ import os
 import glob
 import asyncio
 import csv
-import json
 import re
+import time
 from pathlib import Path
 from neo4j import GraphDatabase
-from neo4j_graphrag.experimental.pipeline.kg_builder import SimpleKGPipeline
-from neo4j_graphrag.llm import OpenAILLM
+from neo4j_graphrag.experimental.components.kg_writer import KGWriter, KGWriterModel, Neo4jWriter
+from neo4j_graphrag.experimental.components.types import LexicalGraphConfig, Neo4jGraph, Neo4jNode, Neo4jRelationship
+from neo4j_graphrag.experimental.pipeline.config.object_config import ComponentType
+from neo4j_graphrag.experimental.pipeline.config.runner import PipelineRunner
+from neo4j_graphrag.experimental.pipeline.config.template_pipeline import SimpleKGPipelineConfig
+from neo4j_graphrag.llm import LLMInterface
+from neo4j_graphrag.llm.types import LLMResponse
 from neo4j_graphrag.embeddings import OpenAIEmbeddings
 from neo4j_graphrag.generation.prompts import ERExtractionTemplate
 from dotenv import load_dotenv
+from pydantic import validate_call
+
+import metrics
+from chunking import CHUNK_OVERLAP, CHUNK_SIZE, CHUNKING_STRATEGY, make_text_splitter
+from company_index import CompanyIndex, canonicalize_companies
+from graph_schema import bootstrap_schema
+from kg_conform import KGSchema, conform
+from llm_router import get_router, response_text
 
 load_dotenv()
 
@@ -36,19 +49,95 @@ def load_company_names(csv_path):
     return sorted(names)
 
 allowed_company_names = load_company_names("data/Company_Filings.csv")
-allowed_set = set(name.upper() for name in allowed_company_names)
+company_index = CompanyIndex(allowed_company_names)
+PRESCAN_MAX_PAGES = 20  # cover page and business overview name the companies a filing is about
 
 # --- LLM, embeddings, prompt template ---
 embedder = OpenAIEmbeddings(api_key=OPENAI_API_KEY)
-llm = OpenAILLM(model_name="gpt-4o", api_key=OPENAI_API_KEY)
+EXTRACTION_MAX_TOKENS = 4096
+
+class RoutedLLM(LLMInterface):
+    """Sends neo4j_graphrag LLM calls through the router, so extraction uses the strongest backend with failover."""
+
+    def __init__(self, router, task="extract"):
+        super().__init__(model_name=f"router:{task}")
+        self.router = router
+        self.task = task
+
+    def invoke(self, input, message_history=None, system_instruction=None):
+        messages = []
+        if system_instruction:
+            messages.append({"role": "system", "content": system_instruction})
+        messages.extend(getattr(message_history, "messages", message_history) or [])
+        messages.append({"role": "user", "content": input})
+        response, _ = self.router.complete(
+            self.task, messages, max_tokens=EXTRACTION_MAX_TOKENS, json_mode=True
+        )
+        return LLMResponse(content=response_text(response))
+
+    async def ainvoke(self, input, message_history=None, system_instruction=None):
+        # The router is blocking (requests); its per-backend quotas bound the threads in use
+        return await asyncio.to_thread(self.invoke, input, message_history, system_instruction)
+
+llm = RoutedLLM(get_router(), task="extract")
+EXTRACTION_CONCURRENCY = int(os.getenv("EXTRACTION_CONCURRENCY", "8"))  # in-flight LLM calls per document
+
+class ThrottledLLM(LLMInterface):
+    """Delegates to ``llm`` with at most ``max_concurrency`` calls in flight."""
+
+    def __init__(self, llm, max_concurrency=EXTRACTION_CONCURRENCY):
+        super().__init__(model_name=llm.model_name, model_params=llm.model_params)
+        self.llm = llm
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def invoke(self, *args, **kwargs):
+        return self.llm.invoke(*args, **kwargs)
+
+    async def ainvoke(self, *args, **kwargs):
+        async with self._semaphore:
+            return await self.llm.ainvoke(*args, **kwargs)
+
+class KGPipelineConfig(SimpleKGPipelineConfig):
+    """SimpleKGPipeline's template with the extractor's chunk fan-out configurable.
+
+    SimpleKGPipeline always builds its LLMEntityRelationExtractor with the default
+    fan-out (5), which would cap extraction below ``max_concurrency``.
+    """
+
+    max_concurrency: int = EXTRACTION_CONCURRENCY
+
+    def _get_extractor(self):
+        extractor = super()._get_extractor()
+        extractor.max_concurrency = self.max_concurrency
+        return extractor
+
+class KGPipeline:
+    """Same components and ``run_async`` as SimpleKGPipeline, built from KGPipelineConfig."""
+
+    def __init__(self, **config):
+        self.runner = PipelineRunner.from_config(KGPipelineConfig.model_validate(config))
 
-joined_names = '\n'.join(f"- {name}" for name in allowed_company_names)
-custom_template_text = (
-    "Extract only information about the following companies...\n"
-    f"Allowed Companies:\n{joined_names}\n\n"
-) + ERExtractionTemplate.DEFAULT_TEMPLATE
+    async def run_async(self, file_path=None, text=None, document_metadata=None):
+        return await self.runner.run({"file_path": file_path, "text": text, "document_metadata": document_metadata})
 
-prompt_template = ERExtractionTemplate(template=custom_template_text)
+def build_prompt_template(company_names):
+    joined_names = '\n'.join(f"- {name}" for name in company_names)
+    custom_template_text = (
+        "Extract only information about the following companies...\n"
+        f"Allowed Companies:\n{joined_names}\n\n"
+    ) + ERExtractionTemplate.DEFAULT_TEMPLATE
+    return ERExtractionTemplate(template=custom_template_text)
+
+prompt_template = build_prompt_template(allowed_company_names)
+
+def prescan_company_names(file_path, max_pages=PRESCAN_MAX_PAGES):
+    """Allow-listed companies that appear in the first pages of a PDF."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    text = " ".join((page.extract_text() or "") for page in reader.pages[:max_pages])
+    return company_index.prescan(text)
 
 entities = [
     {"label": "Executive", "properties": [{"name": "name", "type": "STRING"}]},
@@ -67,54 +156,142 @@ relations = [
     {"label": "MENTIONS"}
 ]
 
-def get_pipeline():
-    return SimpleKGPipeline(
-        driver=driver,
-        llm=llm,
-        embedder=embedder,
+kg_schema = KGSchema(entities, relations)
+MAX_LOGGED_ERRORS = 10
+
+def conform_graph(graph, schema, lexical_graph_config, companies=None):
+    """``graph`` with entities and relations that do not fit ``schema`` dropped; returns (graph, errors).
+
+    With a ``companies`` index, Company names are canonicalized against it and unknown
+    companies dropped. Document/Chunk nodes and their relationships belong to the
+    lexical graph and pass through, except links to entities that were dropped.
+    """
+    lexical_labels = {lexical_graph_config.chunk_node_label, lexical_graph_config.document_node_label}
+    lexical_types = {
+        lexical_graph_config.chunk_to_document_relationship_type,
+        lexical_graph_config.next_chunk_relationship_type,
+        lexical_graph_config.node_to_chunk_relationship_type,
+    }
+    lexical_nodes = [node for node in graph.nodes if node.label in lexical_labels]
+    parsed, errors = conform({
+        "entities": [node.model_dump() for node in graph.nodes if node.label not in lexical_labels],
+        "relations": [rel.model_dump() for rel in graph.relationships if rel.type not in lexical_types],
+    }, schema)
+    if companies is not None:
+        parsed = canonicalize_companies(parsed, companies)
+    kept_ids = {node.id for node in lexical_nodes} | {entity["id"] for entity in parsed["entities"]}
+    lexical_relationships = [
+        rel for rel in graph.relationships
+        if rel.type in lexical_types and rel.start_node_id in kept_ids and rel.end_node_id in kept_ids
+    ]
+    conformed = Neo4jGraph(
+        nodes=lexical_nodes + [Neo4jNode(**entity) for entity in parsed["entities"]],
+        relationships=lexical_relationships + [Neo4jRelationship(**rel) for rel in parsed["relations"]],
+    )
+    return conformed, errors
+
+class ConformingWriter(KGWriter):
+    """Conforms the extracted graph to ``kg_schema``, canonicalizes company names, then writes it with Neo4jWriter.
+
+    SimpleKGPipeline writes inside ``run_async``, so this is the last point where
+    invalid items can be dropped and names fixed before they reach Neo4j (entity
+    resolution, which runs after the writer, then merges the canonical duplicates). ``report`` summarizes
+    the last successful write and stays None until one happens.
+    """
+
+    def __init__(self, driver, schema=kg_schema, companies=company_index):
+        self.writer = Neo4jWriter(driver=driver)
+        self.schema = schema
+        self.companies = companies
+        self.report = None
+
+    @validate_call
+    async def run(
+        self,
+        graph: Neo4jGraph,
+        lexical_graph_config: LexicalGraphConfig = LexicalGraphConfig(),
+    ) -> KGWriterModel:
+        graph, errors = conform_graph(graph, self.schema, lexical_graph_config, self.companies)
+        if errors:
+            print(f"[WARNING] Dropped {len(errors)} invalid item(s) from the extracted graph:")
+            for error in errors[:MAX_LOGGED_ERRORS]:
+                print(f"  - {error}")
+        result = await self.writer.run(graph, lexical_graph_config)
+        if result.status == "SUCCESS":
+            self.report = {
+                "nodes": len(graph.nodes),
+                "relationships": len(graph.relationships),
+                "dropped": len(errors),
+            }
+        return result
+
+def prepare_schema():
+    """Constraints and indexes the pipeline's writes rely on; call once at startup, not per file."""
+    return bootstrap_schema(driver, entities, relations)
+
+def get_pipeline(company_names=None, chunking=CHUNKING_STRATEGY, chunk_size=CHUNK_SIZE,
+                 chunk_overlap=CHUNK_OVERLAP, max_concurrency=EXTRACTION_CONCURRENCY):
+    """Pipeline whose prompt lists ``company_names``, or the whole allow-list when None or empty.
+
+    Build one pipeline per document: ``max_concurrency`` bounds that document's
+    in-flight extraction calls, so chunks are extracted in parallel up to it.
+    """
+    template = build_prompt_template(company_names) if company_names else prompt_template
+    writer = ConformingWriter(driver)
+    pipeline = KGPipeline(
+        neo4j_config=driver,
+        llm_config=ThrottledLLM(llm, max_concurrency),
+        embedder_config=embedder,
         entities=entities,
         relations=relations,
-        prompt_template=prompt_template,
+        from_pdf=True,
+        prompt_template=template,
+        text_splitter=ComponentType(make_text_splitter(chunking, chunk_size, chunk_overlap)),
+        kg_writer=ComponentType(writer),
+        max_concurrency=max_concurrency,
         enforce_schema="STRICT"
     )
+    pipeline.conforming_writer = writer
+    return pipeline
 
-def conform(obj):
-    if isinstance(obj, dict):
-        new_obj = {}
-        for k, v in obj.items():
-            if k == "properties" and v == []:
-                new_obj[k] = {}
-            else:
-                new_obj[k] = conform(v)
-        if set(new_obj.keys()) & {"entities", "relations"}:
-            allowed_keys = {"entities", "relations"}
-            new_obj = {k: v for k, v in new_obj.items() if k in allowed_keys}
-            if "entities" not in new_obj or not isinstance(new_obj["entities"], list):
-                new_obj["entities"] = []
-            if "relations" not in new_obj or not isinstance(new_obj["relations"], list):
-                new_obj["relations"] = []
-        return new_obj
-    elif isinstance(obj, list):
-        return [conform(item) for item in obj]
-    else:
-        return obj
-
-def safe_json_loads_and_conform(content):
+def get_pipeline_for_file(file_path, **kwargs):
+    """Pipeline whose prompt only lists the allow-listed companies found by a pre-scan of the file."""
     try:
-        return conform(json.loads(content))
-    except Exception:
-        return None
+        names = prescan_company_names(file_path)
+    except Exception as e:
+        print(f"[WARNING] Company pre-scan failed on {file_path}, using full allow-list: {e}")
+        return get_pipeline(**kwargs)
+    print(f"[INFO] Pre-scan matched {len(names)} of {len(company_index)} allowed companies")
+    return get_pipeline(names, **kwargs)
+
+async def run_pipeline_on_file(file_path: str, pipeline, raise_errors=False):
+    """The writer's report ({"nodes", "relationships", "dropped"}), or None on failure.
 
-async def run_pipeline_on_file(file_path: str, pipeline):
+    With ``raise_errors`` the failure propagates instead. Once the graph has been
+    written the file counts as ingested, even if a later step (entity resolution) fails.
+    """
     print(f"[INFO] Processing file: {file_path}")
+    writer = pipeline.conforming_writer
+    writer.report = None
+    started = time.perf_counter()
+    status = "error"
     try:
-        result = await pipeline.run_async(file_path=file_path)
-        parsed = safe_json_loads_and_conform(result.llm_output)
-        if parsed:
-            print("[INFO] Successfully conformed LLM output")
-        else:
-            print("[WARNING] LLM output could not be conformed")
-        return parsed
+        try:
+            await pipeline.run_async(file_path=file_path)
+        except Exception as e:
+            if writer.report is None:
+                raise
+            print(f"[WARNING] {file_path} was written, but a later pipeline step failed: {e}")
+        if writer.report is None:
+            raise RuntimeError(f"writer did not report success for {file_path}")
+        status = "ok"
+        print(f"[INFO] Wrote {writer.report['nodes']} nodes and {writer.report['relationships']} relationships")
+        return writer.report
     except Exception as e:
         print(f"[ERROR] Pipeline failed on {file_path}: {e}")
+        if raise_errors:
+            raise
         return None
+    finally:
+        metrics.INGESTED_FILES.labels(status=status).inc()
+        metrics.INGESTION_SECONDS.labels(status=status).observe(time.perf_counter() - started)
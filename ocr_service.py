@@ -0,0 +1,214 @@
+# ocr_service.py
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from PIL import Image, ImageOps
+import pytesseract
+
+import metrics
+
+OCR_CACHE_DIR = Path(os.getenv("OCR_CACHE_DIR", Path(__file__).resolve().parent / ".ocr_cache"))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+MAX_SIDE = 2000        # longest edge after downscaling; tesseract gains little above ~300 DPI
+PAGE_BATCH_SIZE = 4    # pages handed to a worker per task for multi-page scans
+MAX_CHARS = 3000       # same limit the MCP server applies to the other read tools
+OCR_SERVICE_PORT = int(os.getenv("OCR_SERVICE_PORT", "8096"))
+OCR_METRICS_PORT = int(os.getenv("OCR_METRICS_PORT", "9466"))
+
+
+def image_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _otsu_threshold(gray):
+    hist = gray.histogram()
+    total = sum(hist)
+    sum_all = sum(i * count for i, count in enumerate(hist))
+    sum_bg = weight_bg = 0
+    best_threshold, best_variance = 127, 0.0
+    for t, count in enumerate(hist):
+        weight_bg += count
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += t * count
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = t, variance
+    return best_threshold
+
+
+def preprocess(image):
+    """Grayscale, downscale to MAX_SIDE and binarize with an Otsu threshold."""
+    gray = ImageOps.exif_transpose(image).convert("L")
+    if max(gray.size) > MAX_SIDE:
+        gray.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+    threshold = _otsu_threshold(gray)
+    return gray.point(lambda p: 255 if p > threshold else 0, mode="1")
+
+
+def _ocr_pages(path, frames):
+    # Runs in a worker process: one task covers a batch of frames of one file
+    texts = []
+    with Image.open(path) as image:
+        for frame in frames:
+            image.seek(frame)
+            texts.append(pytesseract.image_to_string(preprocess(image), lang=OCR_LANG))
+    return texts
+
+
+class OCRService:
+    def __init__(self, max_workers=None, cache_dir=OCR_CACHE_DIR):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _cache_get(self, digest):
+        cache_file = self.cache_dir / f"{digest}.json"
+        if cache_file.exists():
+            return json.loads(cache_file.read_text(encoding="utf-8"))["text"]
+        return None
+
+    def _cache_put(self, digest, text):
+        cache_file = self.cache_dir / f"{digest}.json"
+        # A unique temp file per writer, so two processes caching the same image cannot interleave
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.cache_dir, suffix=".tmp",
+                                         delete=False) as tmp:
+            json.dump({"text": text}, tmp)
+        os.replace(tmp.name, cache_file)
+
+    def _submit(self, path):
+        with Image.open(path) as image:
+            n_frames = getattr(image, "n_frames", 1)
+        batches = [
+            list(range(start, min(start + PAGE_BATCH_SIZE, n_frames)))
+            for start in range(0, n_frames, PAGE_BATCH_SIZE)
+        ]
+        return [self.executor.submit(_ocr_pages, path, batch) for batch in batches]
+
+    def read_many(self, paths):
+        """OCR several images concurrently; returns {path: text}, served from cache where possible."""
+        results = {}
+        pending = {}
+        for path in paths:
+            digest = image_hash(path)
+            cached = self._cache_get(digest)
+            metrics.CACHE_REQUESTS.labels(cache="ocr", result="miss" if cached is None else "hit").inc()
+            if cached is not None:
+                results[path] = cached
+            else:
+                pending[path] = (digest, self._submit(path))
+        for path, (digest, futures) in pending.items():
+            pages = [text for future in futures for text in future.result()]
+            text = "\n\f\n".join(page.strip() for page in pages)
+            self._cache_put(digest, text)
+            results[path] = text
+        return results
+
+    def read_image_text(self, path):
+        return self.read_many([path])[path]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+_service = None
+
+
+def get_service():
+    global _service
+    if _service is None:
+        _service = OCRService()
+    return _service
+
+
+def read_image_text(path):
+    return get_service().read_image_text(path)
+
+
+# --- HTTP API: keeps one worker pool warm for the MCP server's readImageText ---
+class OCRHandler(BaseHTTPRequestHandler):
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/health":
+            return self._send(200, {"status": "ok"})
+        self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path.split("?")[0] != "/ocr":
+            return self._send(404, {"error": "Not found"})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            paths = json.loads(self.rfile.read(length) or b"{}").get("paths")
+        except ValueError:
+            return self._send(400, {"error": "Body must be JSON with a list of paths"})
+        if not isinstance(paths, list) or not paths:
+            return self._send(400, {"error": "Body must be JSON with a list of paths"})
+        try:
+            texts = get_service().read_many(paths)
+        except Exception as e:
+            return self._send(500, {"error": str(e)})
+        self._send(200, {path: text[:MAX_CHARS] for path, text in texts.items()})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=OCR_SERVICE_PORT):
+    service = get_service()
+    metrics.start_http_server(OCR_METRICS_PORT)
+    server = ThreadingHTTPServer(("127.0.0.1", port), OCRHandler)
+    print(f"OCR service running on port {port} ({service.max_workers} workers)")
+    try:
+        server.serve_forever()
+    finally:
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python3 ocr_service.py --serve | IMAGE [IMAGE ...]", file=sys.stderr)
+        sys.exit(2)
+    if sys.argv[1] == "--serve":
+        serve()
+        sys.exit(0)
+    service = get_service()
+    try:
+        texts = service.read_many(sys.argv[1:])
+        if len(texts) == 1:
+            print(next(iter(texts.values()))[:MAX_CHARS])
+        else:
+            print(json.dumps({p: t[:MAX_CHARS] for p, t in texts.items()}))
+    finally:
+        service.shutdown()
+        metrics.push_to_gateway("ocr_service")
@@ -0,0 +1,181 @@
+# prefetch.py
+import os
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import metrics
+from tenants import QuotaExceeded
+
+PREFETCH_MAX_FILES = int(os.getenv("PREFETCH_MAX_FILES", "20"))           # files warmed per listing
+PREFETCH_MAX_BYTES = int(os.getenv("PREFETCH_MAX_BYTES", str(64 << 20)))  # input bytes warmed per listing
+PREFETCH_CACHE_ENTRIES = 256
+PREFETCH_JOIN_TIMEOUT = 60  # seconds a tool call waits on a prefetch already running for its file
+
+# Read tools whose result depends only on the file, so a warmed result can stand in for the call
+PREFETCH_TOOLS = {"readPDF", "readDocx", "readExcel", "readImageText", "readTextFile", "extractFile"}
+
+MISS = object()
+
+
+def default_fetch(tool, path):
+    # Same path as the foreground call: the registry picks the extractor from the file type
+    from extractors import registry
+    return registry.extract(path)
+
+
+def _file_key(tool, path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    # A file changed after it was warmed gets a new key, so stale results are never served
+    return (tool, path, st.st_mtime_ns, st.st_size)
+
+
+class PrefetchScheduler:
+    """Warms read-tool results for files the model is likely to ask for next.
+
+    Each session (conversation) has its own queue, which a new listing from
+    that session or ``cancel`` replaces; other sessions' queues are untouched.
+    A single background worker takes one prefetch from each session in turn,
+    in listing order, and pauses while a foreground tool call is running.
+    Each prefetch is charged to the listing's tenant and skipped when that
+    tenant has no extraction quota free, so a warmed result served later has
+    already been paid for.
+    """
+
+    def __init__(self, fetch=default_fetch, max_files=PREFETCH_MAX_FILES, max_bytes=PREFETCH_MAX_BYTES,
+                 cache_entries=PREFETCH_CACHE_ENTRIES):
+        self.fetch = fetch
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()   # file key -> result
+        self._inflight = {}           # file key -> Event set when the prefetch finishes
+        self._queues = OrderedDict()  # session -> deque of (tool, path, tenant), in round-robin order
+        self._foreground = 0
+        self._cond = threading.Condition()
+        threading.Thread(target=self._worker, name="prefetch", daemon=True).start()
+
+    def schedule(self, calls, tenant=None, session=None):
+        """Replace ``session``'s queue with ``calls`` ([(tool, path), ...] in likely order), within the budget."""
+        planned, total = [], 0
+        for tool, path in calls:
+            if tool not in PREFETCH_TOOLS or len(planned) >= self.max_files:
+                continue
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            if total + size > self.max_bytes:
+                continue
+            total += size
+            planned.append((tool, path))
+        with self._cond:
+            self._queues.pop(session, None)
+            if planned:
+                self._queues[session] = deque((tool, path, tenant) for tool, path in planned)
+            self._cond.notify_all()
+        return len(planned)
+
+    def cancel(self, session=None):
+        """Drop ``session``'s queued prefetches; one already running finishes and is still cached."""
+        with self._cond:
+            self._queues.pop(session, None)
+
+    @contextmanager
+    def foreground(self):
+        """Mark a user-facing call in progress; prefetching yields to it."""
+        with self._cond:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._foreground -= 1
+                self._cond.notify_all()
+
+    def get(self, tool, path, join_timeout=PREFETCH_JOIN_TIMEOUT):
+        """Warmed result for (tool, path), or MISS. Joins a prefetch of the same file if one is running."""
+        key = _file_key(tool, path)
+        if key is None:
+            return MISS
+        with self._cond:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                metrics.CACHE_REQUESTS.labels(cache="prefetch", result="hit").inc()
+                return self._cache[key]
+            running = self._inflight.get(key)
+            if running is None:
+                # The caller is about to do this work itself; do not repeat it in the background
+                for session, queue in list(self._queues.items()):
+                    queue = deque(item for item in queue if item[:2] != (tool, path))
+                    if queue:
+                        self._queues[session] = queue
+                    else:
+                        del self._queues[session]
+        if running is not None and running.wait(join_timeout):
+            with self._cond:
+                if key in self._cache:
+                    metrics.CACHE_REQUESTS.labels(cache="prefetch", result="hit").inc()
+                    return self._cache[key]
+        metrics.CACHE_REQUESTS.labels(cache="prefetch", result="miss").inc()
+        return MISS
+
+    def _next(self):
+        with self._cond:
+            while True:
+                while not self._queues or self._foreground:
+                    self._cond.wait()
+                # Round robin: take the oldest session's next file, then move it to the back
+                session, queue = next(iter(self._queues.items()))
+                tool, path, tenant = queue.popleft()
+                del self._queues[session]
+                if queue:
+                    self._queues[session] = queue
+                key = _file_key(tool, path)
+                if key is None or key in self._cache or key in self._inflight:
+                    continue
+                done = threading.Event()
+                self._inflight[key] = done
+                return tool, path, tenant, key, done
+
+    def _fetch(self, tool, path, tenant):
+        if tenant is None:
+            return self.fetch(tool, path)
+        # Speculative work never waits for quota that a foreground call could use
+        with tenant.limit("extraction", timeout=0):
+            return self.fetch(tool, path)
+
+    def _worker(self):
+        while True:
+            tool, path, tenant, key, done = self._next()
+            try:
+                result = self._fetch(tool, path, tenant)
+            except QuotaExceeded as e:
+                print(f"[INFO] Prefetch of {tool} {path} skipped: {e}")
+            except Exception as e:
+                # Failures are not cached; the model's own call will surface the error
+                print(f"[WARNING] Prefetch of {tool} {path} failed: {e}")
+            else:
+                with self._cond:
+                    self._cache[key] = result
+                    while len(self._cache) > self.cache_entries:
+                        self._cache.popitem(last=False)
+            finally:
+                with self._cond:
+                    self._inflight.pop(key, None)
+                done.set()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PrefetchScheduler()
+        return _scheduler
@@ -1,12 +1,22 @@
 # run_pdf_loader.py
 import sys
 from pathlib import Path
-from your_pdf_loader_module import get_pipeline, run_pipeline_on_file  # Adjust imports to match your actual module structure
 import asyncio
 
+# The loader lives in the repository root, one level up from the MCP server
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import metrics
+from my_real_pdf_loader import get_pipeline_for_file, prepare_schema, run_pipeline_on_file
+
 def main(pdf_path):
-    pipeline = get_pipeline()  # Your function that returns the configured SimpleKGPipeline
-    asyncio.run(run_pipeline_on_file(pdf_path, pipeline))
+    prepare_schema()
+    pipeline = get_pipeline_for_file(pdf_path)
+    try:
+        asyncio.run(run_pipeline_on_file(pdf_path, pipeline))
+    finally:
+        # This process exits right away, so its ingestion metrics are pushed rather than scraped
+        metrics.push_to_gateway("run_pdf_loader")
 
 if __name__ == "__main__":
     pdf_path = sys.argv[1]
@@ -22,6 +22,26 @@ const driver = neo4j.driver(
 
 
 
+// Uniqueness constraints for the labels the agent MERGEs on name; without them
+// every MERGE is a label scan. The KG labels are handled by graph_schema.py.
+const AGENT_NODE_KEYS = { File: 'name', Category: 'name', Entity: 'name' };
+
+async function ensureSchema() {
+  const session = driver.session();
+  try {
+    for (const [label, prop] of Object.entries(AGENT_NODE_KEYS)) {
+      await session.run(
+        `CREATE CONSTRAINT ${label.toLowerCase()}_${prop}_unique IF NOT EXISTS FOR (n:${label}) REQUIRE n.${prop} IS UNIQUE`
+      );
+    }
+    console.log('✅ Neo4j schema constraints in place');
+  } catch (err) {
+    console.error('⚠️ Could not apply Neo4j schema constraints:', err.message);
+  } finally {
+    await session.close();
+  }
+}
+
 async function saveToNeo4j(cypher, res, id) {
   const session = driver.session();
   try {
@@ -34,6 +54,7 @@ async function saveToNeo4j(cypher, res, id) {
     console.log("📤 Sending Cypher:", cypher);
 
     const result = await session.run(cypher);
+    invalidateGraphCache();
     console.log("✅ Neo4j Aura response:", result.summary);
     res.json({ jsonrpc: '2.0', result: { summary: result.summary }, id });
   } catch (err) {
@@ -44,10 +65,332 @@ async function saveToNeo4j(cypher, res, id) {
   }
 }
 
+// --- queryGraph: parameterized read templates over the agent's graph ---
+const GRAPH_QUERY_TEMPLATES = {
+  listCategories: {
+    description: 'Categories with their file counts',
+    params: [],
+    cypher: `MATCH (c:Category)
+             OPTIONAL MATCH (f:File)-[:BELONGS_TO]->(c)
+             RETURN c.name AS category, count(f) AS files
+             ORDER BY files DESC, category`
+  },
+  filesByCategory: {
+    description: 'Files that belong to a category',
+    params: ['category'],
+    cypher: `MATCH (f:File)-[:BELONGS_TO]->(c:Category)
+             WHERE toLower(c.name) = toLower($category)
+             RETURN f.name AS file, f.summary AS summary, f.pii_flag AS pii_flag
+             ORDER BY file`
+  },
+  piiFiles: {
+    description: 'Files flagged as containing personal or protected information',
+    params: [],
+    cypher: `MATCH (f:File) WHERE f.pii_flag = true
+             RETURN f.name AS file, f.category AS category, f.summary AS summary
+             ORDER BY file`
+  },
+  entitiesByFile: {
+    description: 'Entities mentioned by a file',
+    params: ['file'],
+    cypher: `MATCH (f:File {name: $file})-[:MENTIONS]->(e)
+             RETURN e.name AS entity, labels(e) AS labels, properties(e) AS properties
+             ORDER BY entity`
+  },
+  companyRisks: {
+    description: 'Risk factors a company faces (FACES_RISK)',
+    params: ['company'],
+    cypher: `MATCH (c:Company)-[:FACES_RISK]->(r:RiskFactor)
+             WHERE toLower(c.name) CONTAINS toLower($company)
+             RETURN c.name AS company, r.name AS risk
+             ORDER BY company, risk`
+  },
+  companyMetrics: {
+    description: 'Financial metrics reported by a company (HAS_METRIC)',
+    params: ['company'],
+    cypher: `MATCH (c:Company)-[:HAS_METRIC]->(m:FinancialMetric)
+             WHERE toLower(c.name) CONTAINS toLower($company)
+             RETURN c.name AS company, m.name AS metric
+             ORDER BY company, metric`
+  }
+};
+
+const GRAPH_QUERY_DEFAULT_PAGE_SIZE = 25;
+const GRAPH_QUERY_MAX_PAGE_SIZE = 200;
+const GRAPH_CACHE_TTL_MS = 5 * 60 * 1000;
+const GRAPH_CACHE_MAX_ENTRIES = 500;
+
+// Cleared on every write, so entries can only be stale for writes made outside this server
+const graphQueryCache = new Map();
+let graphCacheGeneration = 0;
+
+function invalidateGraphCache() {
+  graphCacheGeneration++;
+  graphQueryCache.clear();
+}
+
+function toPlain(value) {
+  if (neo4j.isInt(value)) return value.inSafeRange() ? value.toNumber() : value.toString();
+  if (Array.isArray(value)) return value.map(toPlain);
+  if (value && typeof value === 'object') {
+    if (value.properties && value.labels) return toPlain(value.properties); // Node
+    return Object.fromEntries(Object.entries(value).map(([k, v]) => [k, toPlain(v)]));
+  }
+  return value;
+}
+
+async function queryGraph(params) {
+  const template = GRAPH_QUERY_TEMPLATES[params.template];
+  if (!template) {
+    const err = new Error(`Unknown template '${params.template}'. Available: ${Object.keys(GRAPH_QUERY_TEMPLATES).join(', ')}`);
+    err.code = -32602;
+    throw err;
+  }
+  const args = params.params || {};
+  const missing = template.params.filter(p => args[p] === undefined || args[p] === '');
+  if (missing.length) {
+    const err = new Error(`Template '${params.template}' requires: ${missing.join(', ')}`);
+    err.code = -32602;
+    throw err;
+  }
+
+  const pageSize = Math.min(Math.max(parseInt(params.pageSize, 10) || GRAPH_QUERY_DEFAULT_PAGE_SIZE, 1), GRAPH_QUERY_MAX_PAGE_SIZE);
+  const page = Math.max(parseInt(params.page, 10) || 1, 1);
+  const queryArgs = Object.fromEntries(template.params.map(p => [p, args[p]]));
+  const cacheKey = JSON.stringify([params.template, queryArgs, page, pageSize]);
+
+  const cached = graphQueryCache.get(cacheKey);
+  if (cached && cached.expires > Date.now()) {
+    return { ...cached.result, cached: true };
+  }
+
+  const generation = graphCacheGeneration;
+  const session = driver.session({ defaultAccessMode: neo4j.session.READ });
+  try {
+    // Fetch one extra row to know whether another page exists
+    const result = await session.executeRead(tx => tx.run(
+      `${template.cypher} SKIP $skip LIMIT $limit`,
+      { ...queryArgs, skip: neo4j.int((page - 1) * pageSize), limit: neo4j.int(pageSize + 1) }
+    ));
+    const rows = result.records.map(r => toPlain(r.toObject()));
+    const pageResult = {
+      template: params.template,
+      page,
+      pageSize,
+      hasMore: rows.length > pageSize,
+      rows: rows.slice(0, pageSize)
+    };
+    // Skip caching if a write landed while this read was in flight
+    if (generation === graphCacheGeneration) {
+      if (graphQueryCache.size >= GRAPH_CACHE_MAX_ENTRIES) {
+        graphQueryCache.delete(graphQueryCache.keys().next().value); // oldest entry
+      }
+      graphQueryCache.set(cacheKey, { result: pageResult, expires: Date.now() + GRAPH_CACHE_TTL_MS });
+    }
+    return { ...pageResult, cached: false };
+  } finally {
+    await session.close();
+  }
+}
+
 const express = require('express');
 const fs = require('fs');
 const app = express();
 
+const OCR_SERVICE_URL = process.env.OCR_SERVICE_URL || 'http://127.0.0.1:8096';
+
+// --- walkDir helpers ---
+const MIME_TYPES = {
+  '.pdf': 'application/pdf',
+  '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+  '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+  '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+  '.xls': 'application/vnd.ms-excel',
+  '.doc': 'application/msword',
+  '.txt': 'text/plain',
+  '.md': 'text/markdown',
+  '.csv': 'text/csv',
+  '.json': 'application/json',
+  '.html': 'text/html',
+  '.htm': 'text/html',
+  '.xml': 'application/xml',
+  '.eml': 'message/rfc822',
+  '.png': 'image/png',
+  '.jpg': 'image/jpeg',
+  '.jpeg': 'image/jpeg',
+  '.gif': 'image/gif',
+  '.tif': 'image/tiff',
+  '.tiff': 'image/tiff',
+  '.zip': 'application/zip'
+};
+
+// Magic numbers for files whose extension is missing or unknown
+const MAGIC_TYPES = [
+  { bytes: [0x25, 0x50, 0x44, 0x46], mime: 'application/pdf' },
+  { bytes: [0x89, 0x50, 0x4e, 0x47], mime: 'image/png' },
+  { bytes: [0xff, 0xd8, 0xff], mime: 'image/jpeg' },
+  { bytes: [0x47, 0x49, 0x46, 0x38], mime: 'image/gif' },
+  { bytes: [0x49, 0x49, 0x2a, 0x00], mime: 'image/tiff' },
+  { bytes: [0x4d, 0x4d, 0x00, 0x2a], mime: 'image/tiff' },
+  { bytes: [0x50, 0x4b, 0x03, 0x04], mime: 'application/zip' }
+];
+
+const WALK_DEFAULT_PAGE_SIZE = 200;
+const WALK_MAX_PAGE_SIZE = 1000;
+
+function detectMime(filePath, sniff) {
+  const mime = MIME_TYPES[path.extname(filePath).toLowerCase()];
+  if (mime || !sniff) {
+    return mime || 'application/octet-stream';
+  }
+  let fd;
+  try {
+    fd = fs.openSync(filePath, 'r');
+    const header = Buffer.alloc(8);
+    const n = fs.readSync(fd, header, 0, header.length, 0);
+    const match = MAGIC_TYPES.find(m => n >= m.bytes.length && m.bytes.every((b, i) => header[i] === b));
+    return match ? match.mime : 'application/octet-stream';
+  } catch (err) {
+    return 'application/octet-stream';
+  } finally {
+    if (fd !== undefined) fs.closeSync(fd);
+  }
+}
+
+function globToRegExp(glob) {
+  let re = '';
+  for (let i = 0; i < glob.length; i++) {
+    const ch = glob[i];
+    if (ch === '*' && glob[i + 1] === '*') {
+      // "**/" matches zero or more directories
+      if (glob[i + 2] === '/') {
+        re += '(?:.*/)?';
+        i += 2;
+      } else {
+        re += '.*';
+        i += 1;
+      }
+    } else if (ch === '*') {
+      re += '[^/]*';
+    } else if (ch === '?') {
+      re += '[^/]';
+    } else {
+      re += ch.replace(/[.+^${}()|[\]\\]/g, '\\$&');
+    }
+  }
+  return new RegExp(`^${re}$`);
+}
+
+// Patterns without a slash match the basename anywhere in the tree
+function compileGlobs(globs) {
+  return (globs || []).map(g => ({ re: globToRegExp(g), basename: !g.includes('/') }));
+}
+
+function matchesAny(compiled, relPath) {
+  const name = path.posix.basename(relPath);
+  return compiled.some(g => g.re.test(g.basename ? name : relPath));
+}
+
+function encodeCursor(state) {
+  return Buffer.from(JSON.stringify(state)).toString('base64url');
+}
+
+function insideRoot(root, relDir) {
+  const abs = path.resolve(root, relDir);
+  return abs === root || abs.startsWith(root + path.sep);
+}
+
+// Cursors come back from the client, so every directory in one must stay under the walk's root
+function decodeCursor(cursor, root) {
+  let state;
+  try {
+    state = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+  } catch (err) {
+    throw new Error('Invalid cursor');
+  }
+  const dirs = state && Array.isArray(state.pending) ? [...state.pending, state.dir ?? ''] : null;
+  if (!dirs || !Number.isInteger(state.offset) || state.offset < 0 ||
+      !dirs.every(d => typeof d === 'string' && insideRoot(root, d))) {
+    throw new Error('Invalid cursor');
+  }
+  return state;
+}
+
+// Returns one page of a breadth-first walk. The cursor records the directory
+// being read, the offset into its (sorted) listing and the directories still
+// to visit, so every page is served without holding state on the server.
+async function walkDirPage(params) {
+  const root = path.resolve(params.path);
+  const recursive = params.recursive !== false;
+  const maxDepth = Number.isInteger(params.maxDepth) ? params.maxDepth : Infinity;
+  const requestedSize = Number.isInteger(params.pageSize) ? params.pageSize : WALK_DEFAULT_PAGE_SIZE;
+  const pageSize = Math.max(1, Math.min(requestedSize, WALK_MAX_PAGE_SIZE));
+  const include = compileGlobs(params.include);
+  const exclude = compileGlobs(params.exclude);
+
+  const state = params.cursor
+    ? decodeCursor(params.cursor, root)
+    : { dir: '', offset: 0, pending: [] };
+  const entries = [];
+  const errors = [];
+
+  while (state.dir !== null && entries.length < pageSize) {
+    const absDir = path.join(root, state.dir);
+    const depth = state.dir === '' ? 0 : state.dir.split('/').length;
+    let names;
+    try {
+      names = (await fs.promises.readdir(absDir)).sort();
+    } catch (err) {
+      // Unreadable or removed since it was queued: report it and move on so the walk can continue
+      errors.push({ path: absDir, error: err.code || err.message });
+      names = [];
+      state.offset = 0;
+    }
+
+    while (state.offset < names.length && entries.length < pageSize) {
+      const name = names[state.offset++];
+      const relPath = state.dir === '' ? name : `${state.dir}/${name}`;
+      if (matchesAny(exclude, relPath)) continue;
+
+      let stat;
+      try {
+        stat = await fs.promises.lstat(path.join(absDir, name));
+      } catch (err) {
+        continue; // removed between readdir and stat
+      }
+
+      if (stat.isDirectory()) {
+        if (recursive && depth + 1 <= maxDepth) state.pending.push(relPath);
+      } else if (include.length && !matchesAny(include, relPath)) {
+        continue;
+      }
+
+      const type = stat.isDirectory() ? 'dir' : stat.isSymbolicLink() ? 'symlink' : 'file';
+      entries.push({
+        path: path.join(absDir, name),
+        relPath,
+        name,
+        type,
+        size: stat.size,
+        mtimeMs: stat.mtimeMs,
+        ino: stat.ino,
+        mime: type === 'file' ? detectMime(path.join(absDir, name), params.sniff) : null
+      });
+    }
+
+    if (state.offset >= names.length) {
+      state.dir = state.pending.length ? state.pending.shift() : null;
+      state.offset = 0;
+    }
+  }
+
+  return {
+    entries,
+    errors,
+    nextCursor: state.dir === null ? null : encodeCursor(state)
+  };
+}
+
 // Enable CORS for all routes
 app.use((req, res, next) => {
   res.header('Access-Control-Allow-Origin', '*');
@@ -72,11 +415,16 @@ app.post('/mcp', (req, res) => {
       result: {
         capabilities: {
           readFile: { supported: true, description: 'Read a file from disk' },
+          readTextFile: { supported: true, description: 'Read the start of a plain text file' },
           writeFile: { supported: true, description: 'Write a file to disk' },
           listDir: { supported: true, description: 'List directory contents' },
+          readImageText: { supported: true, description: 'Extract text from images using OCR' },
+          walkDir: { supported: true, description: 'Recursively list directory entries with metadata, one page at a time' },
           get_weather: { supported: true, description: 'Get the current weather conditions for a location' },
           saveToNeo4j: { supported: true, description: 'Save Cypher query to Neo4j via HTTP' },
-          processPdf: { supported: true, description: 'Process a PDF file into Neo4j using the GraphRAG pipeline' }
+          processPdf: { supported: true, description: 'Process a PDF file into Neo4j using the GraphRAG pipeline' },
+          queryGraph: { supported: true, description: 'Run a cached, paginated read template against Neo4j' },
+          askFilings: { supported: true, description: 'Answer a question about filings from vector-indexed chunks and KG entities' }
 
         },
         serverName: 'simple-mcp-fileserver',
@@ -98,6 +446,17 @@ app.post('/mcp', (req, res) => {
       console.log('readFile success:', JSON.stringify(okResp));
       res.json(okResp);
     });
+  } else if (method === 'readTextFile') {
+    fs.readFile(params.path, 'utf8', (err, data) => {
+      if (err) {
+        const errorResp = { jsonrpc: '2.0', error: { code: 1, message: err.message }, id };
+        console.log('readTextFile error:', JSON.stringify(errorResp));
+        return res.json(errorResp);
+      }
+      const okResp = { jsonrpc: '2.0', result: data.slice(0, 3000), id }; // same limit as the other read tools
+      console.log('readTextFile success:', JSON.stringify(okResp));
+      res.json(okResp);
+    });
   } else if (method === 'writeFile') {
     fs.writeFile(params.path, params.content, err => {
       if (err) {
@@ -120,6 +479,18 @@ app.post('/mcp', (req, res) => {
       console.log('listDir success:', JSON.stringify(okResp));
       res.json(okResp);
     });
+  } else if (method === 'walkDir') {
+    walkDirPage(params)
+      .then(page => {
+        const okResp = { jsonrpc: '2.0', result: page, id };
+        console.log(`walkDir success: ${page.entries.length} entries, more=${page.nextCursor !== null}`);
+        res.json(okResp);
+      })
+      .catch(err => {
+        const errorResp = { jsonrpc: '2.0', error: { code: 1, message: err.message }, id };
+        console.log('walkDir error:', JSON.stringify(errorResp));
+        res.json(errorResp);
+      });
   } else if (method === 'readPDF') {
     const pdf = require('pdf-parse');
     try {
@@ -169,6 +540,22 @@ app.post('/mcp', (req, res) => {
       console.log('readExcel error:', JSON.stringify(errorResp));
       res.json(errorResp);
     }
+  } else if (method === 'readImageText') {
+    // OCR runs in the long-lived ocr_service.py worker (python3 ocr_service.py --serve),
+    // which keeps its process pool and cache warm between requests
+    const axios = require('axios');
+    axios.post(`${OCR_SERVICE_URL}/ocr`, { paths: [params.path] })
+      .then(response => {
+        const okResp = { jsonrpc: '2.0', result: response.data[params.path].slice(0, 3000), id }; // limit content
+        console.log('readImageText success:', JSON.stringify(okResp));
+        res.json(okResp);
+      })
+      .catch(err => {
+        const message = (err.response && err.response.data && err.response.data.error) || err.message;
+        const errorResp = { jsonrpc: '2.0', error: { code: 1, message }, id };
+        console.log('readImageText error:', JSON.stringify(errorResp));
+        res.json(errorResp);
+      });
   } else if (method === 'get_weather') {
     const axios = require('axios');
     const location = params.location;
@@ -236,6 +623,7 @@ app.post('/mcp', (req, res) => {
           };
           return res.json(errorResp);
         }
+        invalidateGraphCache();
         console.log(`[MCP] ✅ PDF processing complete`);
         const okResp = {
           jsonrpc: '2.0',
@@ -247,6 +635,37 @@ app.post('/mcp', (req, res) => {
     
       
         
+  } else if (method === 'askFilings') {
+    const { execFile } = require('child_process');
+    const retrieverScript = path.resolve(__dirname, '../graph_retriever.py');
+    execFile('python3', [retrieverScript, params.question], { maxBuffer: 16 * 1024 * 1024 }, (error, stdout, stderr) => {
+      if (error) {
+        const errorResp = { jsonrpc: '2.0', error: { code: 1, message: stderr || error.message }, id };
+        console.log('askFilings error:', JSON.stringify(errorResp));
+        return res.json(errorResp);
+      }
+      try {
+        const okResp = { jsonrpc: '2.0', result: JSON.parse(stdout), id };
+        console.log('askFilings success:', JSON.stringify(okResp));
+        res.json(okResp);
+      } catch (err) {
+        const errorResp = { jsonrpc: '2.0', error: { code: 1, message: `Invalid retriever output: ${err.message}` }, id };
+        console.log('askFilings error:', JSON.stringify(errorResp));
+        res.json(errorResp);
+      }
+    });
+  } else if (method === 'queryGraph') {
+    queryGraph(params)
+      .then(result => {
+        const okResp = { jsonrpc: '2.0', result, id };
+        console.log(`queryGraph success: ${params.template} page ${result.page}, ${result.rows.length} rows, cached=${result.cached}`);
+        res.json(okResp);
+      })
+      .catch(err => {
+        const errorResp = { jsonrpc: '2.0', error: { code: err.code === -32602 ? -32602 : 500, message: err.message }, id };
+        console.log('queryGraph error:', JSON.stringify(errorResp));
+        res.json(errorResp);
+      });
   } else {
     const errorResp = { jsonrpc: '2.0', error: { code: -32601, message: 'Method not found' }, id };
     console.log('Unknown method:', JSON.stringify(errorResp));
@@ -263,4 +682,7 @@ app.get('/health', (req, res) => {
   res.send('ok');
 });
 
-app.listen(PORT, () => console.log(`MCP FileServer running on port ${PORT}`));
+app.listen(PORT, () => {
+  console.log(`MCP FileServer running on port ${PORT}`);
+  ensureSchema();
+});
@@ -0,0 +1,210 @@
+# slack_notifier.py
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+from tenants import RateLimiter
+
+load_dotenv()
+
+SLACK_TOKEN = os.getenv("SLACKBOT")
+SLACK_USER_CACHE = os.getenv("SLACK_USER_CACHE", "slack_user_ids.json")  # email -> Slack user id, kept between runs
+LOOKUP_WORKERS = 8
+SEND_WORKERS = 4
+MAX_RETRIES = 5
+
+# Requests per minute, a little under Slack's published tiers:
+# users.lookupByEmail, conversations.open and files.sharedPublicURL are Tier 3
+# (50+/min); files.upload is Tier 2 (20+/min); chat.postMessage allows about
+# one message per second per channel, and every DM here is its own channel.
+RATE_LIMITS = {
+    "users_lookupByEmail": 45,
+    "conversations_open": 45,
+    "files_sharedPublicURL": 45,
+    "files_upload_v2": 18,
+    "chat_postMessage": 90,
+}
+
+
+def compliance_message(name, attachments):
+    """Reminder text; ``attachments`` are (filename, public permalink) pairs linked at the end."""
+    text = (
+        f"Hi {name}, our records show that your laptop hasn't backed up in over 7 days. "
+        "To stay compliant with our data protection policy, please follow the steps below to reactivate your backup client. "
+        "If you're unable to complete this in [3 days], we'll need to schedule time with you directly to resolve it.\n\n"
+    )
+    if attachments:
+        text += "\n".join(f"📎 <{permalink}|{filename}>" for filename, permalink in attachments) + "\n\n"
+    return text + "_This message was sent on behalf of the IT Service Desk at Day One Bio._"
+
+
+class BulkNotifier:
+    """Sends one DM per user with shared attachments.
+
+    Attachments are read from disk once and uploaded into each recipient's DM
+    so the file is shared with them; a bot-private upload linked by permalink
+    cannot be opened by anyone else. With ``public_links`` they are instead
+    uploaded once, shared through files.sharedPublicURL and linked from every
+    message. Email lookups run concurrently
+    through a persistent email -> user id cache, and every API call goes
+    through a per-method rate limiter. A 429 pauses all workers for the
+    Retry-After the server asked for.
+    """
+
+    def __init__(self, client, cache_path=SLACK_USER_CACHE, rate_limits=RATE_LIMITS, public_links=False):
+        self.client = client
+        self.cache_path = cache_path
+        self.public_links = public_links
+        self._limiters = {method: RateLimiter(per_minute) for method, per_minute in rate_limits.items()}
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._user_ids = {}
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, encoding="utf-8") as f:
+                self._user_ids = json.load(f)
+
+    def _call(self, method, **kwargs):
+        limiter = self._limiters.get(method)
+        for attempt in range(MAX_RETRIES + 1):
+            with self._lock:
+                pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                time.sleep(pause)
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                return getattr(self.client, method)(**kwargs)
+            except SlackApiError as e:
+                if e.response.status_code != 429 or attempt == MAX_RETRIES:
+                    raise
+                retry_after = int(e.response.headers.get("Retry-After", 1))
+                print(f"⏳ Rate limited on {method}, retrying in {retry_after}s")
+                with self._lock:
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def load_attachments(self, paths):
+        """(filename, bytes) for each file, read once and reused for every recipient."""
+        attachments = []
+        for path in paths:
+            with open(path, "rb") as f:
+                attachments.append((os.path.basename(path), f.read()))
+        return attachments
+
+    def publish_attachments(self, attachments):
+        """Upload each file once and share it publicly; returns (filename, public permalink) pairs."""
+        links = []
+        for filename, content in attachments:
+            file_id = self._call("files_upload_v2", content=content, filename=filename, title=filename)["file"]["id"]
+            shared = self._call("files_sharedPublicURL", file=file_id)["file"]
+            links.append((filename, shared["permalink_public"]))
+            print(f"📄 Uploaded {filename} once and shared it publicly")
+        return links
+
+    def _lookup(self, email):
+        try:
+            return self._call("users_lookupByEmail", email=email)["user"]["id"]
+        except SlackApiError as e:
+            if e.response["error"] == "users_not_found":
+                print(f"⚠️ User not found for email: {email}")
+            else:
+                print(f"❌ Error looking up {email}: {e.response['error']}")
+            return None
+
+    def resolve_emails(self, emails):
+        """email -> Slack user id (None when unknown), looking up only emails missing from the cache."""
+        missing = [email for email in dict.fromkeys(emails) if email not in self._user_ids]
+        with ThreadPoolExecutor(max_workers=LOOKUP_WORKERS) as pool:
+            for email, user_id in zip(missing, pool.map(self._lookup, missing)):
+                if user_id:
+                    self._user_ids[email] = user_id
+        if missing and self.cache_path:
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump(self._user_ids, f, indent=2)
+        return {email: self._user_ids.get(email) for email in emails}
+
+    def _send(self, user_id, name, attachments, links):
+        try:
+            if attachments:
+                # Uploading into the DM shares the files with the recipient; the
+                # reminder goes along as the upload's message.
+                channel = self._call("conversations_open", users=user_id)["channel"]["id"]
+                self._call(
+                    "files_upload_v2",
+                    channel=channel,
+                    initial_comment=compliance_message(name, links),
+                    file_uploads=[
+                        {"content": content, "filename": filename, "title": filename}
+                        for filename, content in attachments
+                    ],
+                )
+            else:
+                self._call("chat_postMessage", channel=user_id, text=compliance_message(name, links))
+            print(f"✅ Message sent to {name} ({user_id})")
+            return "sent"
+        except SlackApiError as e:
+            print(f"❌ Error sending message to {name}: {e.response['error']}")
+            return f"error: {e.response['error']}"
+
+    def notify(self, users, file_paths=()):
+        """Message every {email: name} in ``users``; returns {email: "sent" | "not_found" | "error: ..."}."""
+        attachments = self.load_attachments(file_paths)
+        links = []
+        if self.public_links and attachments:
+            links, attachments = self.publish_attachments(attachments), []
+        user_ids = self.resolve_emails(list(users))
+        results = {email: "not_found" for email, user_id in user_ids.items() if not user_id}
+        with ThreadPoolExecutor(max_workers=SEND_WORKERS) as pool:
+            futures = {
+                email: pool.submit(self._send, user_id, users[email], attachments, links)
+                for email, user_id in user_ids.items() if user_id
+            }
+            for email, future in futures.items():
+                results[email] = future.result()
+        return results
+
+
+def load_users(path):
+    """{email: name} from a JSON object or a CSV file with email,name columns."""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        return {row["email"].strip(): row["name"].strip() for row in csv.DictReader(f)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DM backup-compliance reminders to a list of Slack users.")
+    parser.add_argument("users", help="CSV (email,name) or JSON ({email: name}) file of recipients")
+    parser.add_argument("--attach", nargs="*", default=[], help="Files to share into every recipient's DM")
+    parser.add_argument(
+        "--public-links", action="store_true",
+        help="Upload attachments once, share them publicly and link them instead of sharing into each DM",
+    )
+    args = parser.parse_args()
+
+    if not SLACK_TOKEN:
+        print("Error: SLACKBOT environment variable not set or .env file not found.")
+        raise SystemExit(1)
+    missing = [path for path in args.attach if not os.path.exists(path)]
+    if missing:
+        print(f"❌ Attachment(s) not found: {', '.join(missing)}. Aborting.")
+        raise SystemExit(1)
+
+    users = load_users(args.users)
+    started = time.perf_counter()
+    results = BulkNotifier(WebClient(token=SLACK_TOKEN), public_links=args.public_links).notify(users, args.attach)
+    counts = {}
+    for status in results.values():
+        counts[status] = counts.get(status, 0) + 1
+    print(f"\nNotified {len(users)} user(s) in {time.perf_counter() - started:.1f}s: {counts}")
+
+
+if __name__ == "__main__":
+    main()
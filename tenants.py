@@ -0,0 +1,256 @@
+# tenants.py
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+TENANTS_FILE = os.getenv("TENANTS_FILE", "tenants.json")
+DEFAULT_TENANT = os.getenv("TENANT", "default")
+DEFAULT_ROOT = os.getenv("TENANT_ROOT", "~/Downloads")
+QUOTA_WAIT_SECONDS = 60  # how long a call waits for its tenant's quota before failing
+# Quota state shared by every UI replica, the job service and the prefetch workers using the same file
+QUOTA_DB_PATH = os.getenv("QUOTA_DB_PATH", "quotas.sqlite3")
+QUOTA_LEASE_SECONDS = int(os.getenv("QUOTA_LEASE_SECONDS", "3600"))  # a slot left by a crashed process frees after this
+QUOTA_POLL_SECONDS = 0.2
+
+# Per-tenant limits; tenants.json entries override any of these
+DEFAULT_QUOTAS = {
+    "extraction_concurrency": 4,
+    "extraction_per_minute": 240,
+    "llm_concurrency": 2,
+    "llm_per_minute": 60,
+    "max_jobs": 2,  # concurrently running job-service jobs per kind
+}
+
+
+class PathNotAllowed(PermissionError):
+    pass
+
+
+class QuotaExceeded(RuntimeError):
+    pass
+
+
+class RateLimiter:
+    """Token bucket: ``per_minute`` steady rate, bursts up to ``burst`` calls. None means unlimited."""
+
+    def __init__(self, per_minute, burst=None):
+        self.per_minute = per_minute
+        self.capacity = burst or max(1, (per_minute or 0) // 6)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        if not self.per_minute:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        rate = self.per_minute / 60.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class QuotaStore:
+    """Per-tenant token buckets and concurrency slots in SQLite, so quotas hold across processes.
+
+    Every check runs in a BEGIN IMMEDIATE transaction, which serializes it
+    against the other processes sharing the file. Slots are leases: one not
+    released within QUOTA_LEASE_SECONDS (its process died) is reclaimed.
+    """
+
+    def __init__(self, path=QUOTA_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS quota_buckets (
+                tenant TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (tenant, kind)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS quota_slots (
+                id TEXT PRIMARY KEY,
+                tenant TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def take_token(self, tenant_id, kind, per_minute, capacity):
+        """0 when a token was taken, else the seconds until one is due."""
+        rate = per_minute / 60.0
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM quota_buckets WHERE tenant = ? AND kind = ?", (tenant_id, kind)
+            ).fetchone()
+            tokens = capacity if row is None else min(capacity, row["tokens"] + (now - row["updated_at"]) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            conn.execute(
+                "INSERT OR REPLACE INTO quota_buckets (tenant, kind, tokens, updated_at) VALUES (?, ?, ?, ?)",
+                (tenant_id, kind, tokens, now)
+            )
+        return wait
+
+    def take_slot(self, tenant_id, kind, limit):
+        """A slot id when fewer than ``limit`` are held, else None."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM quota_slots WHERE expires_at < ?", (now,))
+            held = conn.execute(
+                "SELECT COUNT(*) AS n FROM quota_slots WHERE tenant = ? AND kind = ?", (tenant_id, kind)
+            ).fetchone()["n"]
+            if held >= limit:
+                return None
+            slot_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO quota_slots (id, tenant, kind, expires_at) VALUES (?, ?, ?, ?)",
+                (slot_id, tenant_id, kind, now + QUOTA_LEASE_SECONDS)
+            )
+        return slot_id
+
+    def release_slot(self, slot_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM quota_slots WHERE id = ?", (slot_id,))
+
+
+_quota_store = None
+_quota_store_lock = threading.Lock()
+
+
+def get_quota_store():
+    global _quota_store
+    with _quota_store_lock:
+        if _quota_store is None:
+            _quota_store = QuotaStore()
+        return _quota_store
+
+
+class Tenant:
+    """A root directory the tenant's tools are sandboxed to, plus its extraction and LLM quotas.
+
+    ``users`` are the signed-in emails that belong to the tenant. Quotas are
+    kept in the shared QuotaStore, so replicas and workers draw on one budget.
+    """
+
+    def __init__(self, tenant_id, root, users=(), **quotas):
+        unknown = set(quotas) - set(DEFAULT_QUOTAS)
+        if unknown:
+            raise ValueError(f"Unknown quota setting(s) for tenant {tenant_id}: {', '.join(sorted(unknown))}")
+        self.id = tenant_id
+        self.root = os.path.realpath(os.path.expanduser(root))
+        self.users = {user.lower() for user in users}
+        self.quotas = {**DEFAULT_QUOTAS, **quotas}
+
+    def resolve(self, path):
+        """Absolute real path for ``path`` inside the root; relative paths are taken from the root.
+
+        Symlinks and ``..`` are resolved before the check, so neither can lead outside.
+        """
+        path = os.path.expanduser(str(path or ""))
+        full = os.path.realpath(path if os.path.isabs(path) else os.path.join(self.root, path))
+        if full != self.root and not full.startswith(self.root + os.sep):
+            raise PathNotAllowed(f"Path {path!r} is outside the root for tenant {self.id}")
+        return full
+
+    @contextmanager
+    def limit(self, kind, timeout=QUOTA_WAIT_SECONDS):
+        """Hold one of the tenant's ``kind`` ("extraction" or "llm") slots, within its rate.
+
+        ``timeout`` None waits as long as it takes.
+        """
+        store = get_quota_store()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        per_minute = self.quotas[f"{kind}_per_minute"]
+        while per_minute:
+            wait = store.take_token(self.id, kind, per_minute, max(1, per_minute // 6))
+            if not wait:
+                break
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise QuotaExceeded(f"Tenant {self.id} is over its {kind} rate limit")
+            time.sleep(wait)
+        while (slot_id := store.take_slot(self.id, kind, self.quotas[f"{kind}_concurrency"])) is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise QuotaExceeded(f"Tenant {self.id} has too many {kind} calls in flight")
+            time.sleep(QUOTA_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            store.release_slot(slot_id)
+
+
+def load_tenants(path=TENANTS_FILE):
+    """Tenants from ``path`` ({"tenant_id": {"root": ..., "users": [...], <quota>: ...}}), or one default tenant."""
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        return {tenant_id: Tenant(tenant_id, **settings) for tenant_id, settings in config.items()}
+    return {DEFAULT_TENANT: Tenant(DEFAULT_TENANT, DEFAULT_ROOT)}
+
+
+_tenants = None
+_tenants_lock = threading.Lock()
+
+
+def get_tenant(tenant_id=None):
+    global _tenants
+    with _tenants_lock:
+        if _tenants is None:
+            _tenants = load_tenants()
+    if tenant_id is None:
+        tenant_id = DEFAULT_TENANT if DEFAULT_TENANT in _tenants else next(iter(_tenants))
+    if tenant_id not in _tenants:
+        raise KeyError(f"Unknown tenant: {tenant_id}")
+    return _tenants[tenant_id]
+
+
+def tenant_for_user(email=None):
+    """The tenant that lists ``email`` in its users, else this deployment's TENANT.
+
+    Raises PermissionError for a signed-in user when the deployment's tenant
+    only admits listed users.
+    """
+    default = get_tenant()
+    if email is None:
+        return default
+    for tenant in _tenants.values():
+        if email.lower() in tenant.users:
+            return tenant
+    if default.users:
+        raise PermissionError(f"User {email} does not belong to any tenant")
+    return default
@@ -0,0 +1,344 @@
+# tool_schemas.py
+import json
+
+# Tool definitions sent to the model (OpenAI/Llama function-calling format)
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "listDir",
+            "description": "List files in a directory.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "Directory path to list"
+                    }
+                },
+                "required": ["path"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "readTextFile",
+            "description": "Read plain text files.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "Path to the .txt file"
+                    }
+                },
+                "required": ["path"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "readPDF",
+            "description": "Extract text from PDF files.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "Path to the PDF file"
+                    }
+                },
+                "required": ["path"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "readDocx",
+            "description": "Extract text from Word documents (.docx).",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "Path to the DOCX file"
+                    }
+                },
+                "required": ["path"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "readExcel",
+            "description": "Extract rows from Excel spreadsheets.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "Path to the Excel file"
+                    }
+                },
+                "required": ["path"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "readImageText",
+            "description": "Extract text from images using OCR.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "Path to the image file"
+                    }
+                },
+                "required": ["path"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "extractFile",
+            "description": "Extract text from other supported files (PowerPoint, HTML, email, CSV).",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "Path to the file"
+                    }
+                },
+                "required": ["path"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_weather",
+            "description": "Get the current weather conditions for a location, or for several at once.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "location": {
+                        "type": "string",
+                        "description": "The city or location to get the weather for"
+                    },
+                    "locations": {
+                        "type": "array",
+                        "items": {"type": "string", "minLength": 1},
+                        "description": "Several cities to look up in one call, e.g. to compare them"
+                    }
+                },
+                "anyOf": [{"required": ["location"]}, {"required": ["locations"]}]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "saveToNeo4j",
+            "description": "Send Cypher statements to Neo4j.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "cypher": {
+                        "type": "string",
+                        "minLength": 1,
+                        "description": "The full Cypher query to execute."
+                    }
+                },
+                "required": ["cypher"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "queryGraph",
+            "description": "Answer questions from the Neo4j graph using a parameterized read template. Results are paginated.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "template": {
+                        "type": "string",
+                        "enum": [
+                            "listCategories", "filesByCategory", "piiFiles",
+                            "entitiesByFile", "companyRisks", "companyMetrics"
+                        ],
+                        "description": "Read template to run"
+                    },
+                    "params": {
+                        "type": "object",
+                        "description": "Template parameters: category, file or company"
+                    },
+                    "page": {
+                        "type": "integer",
+                        "minimum": 1,
+                        "description": "1-based page number (default 1)"
+                    }
+                },
+                "required": ["template"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "askFilings",
+            "description": "Answer a question about processed company filings using vector search over filing chunks plus the knowledge graph.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "question": {
+                        "type": "string",
+                        "description": "The question to answer from the filings"
+                    }
+                },
+                "required": ["question"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "processPdf",
+            "description": "Process a PDF file into Neo4j using the GraphRAG pipeline.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "Full path to the PDF file to process."
+                    }
+                },
+                "required": ["path"]
+            }
+        }
+    }
+]
+
+TOOL_PARAMETERS = {tool["function"]["name"]: tool["function"]["parameters"] for tool in TOOLS}
+
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+
+def validate(value, schema, path="$"):
+    """Errors for ``value`` against the JSON Schema subset used here (type, properties,
+    required, additionalProperties, enum, const, items, minLength, minimum, anyOf).
+    """
+    errors = []
+    expected = schema.get("type")
+    if expected:
+        py_type = _JSON_TYPES[expected]
+        # bool is an int subclass in Python but not a JSON number
+        if not isinstance(value, py_type) or (isinstance(value, bool) and expected != "boolean"):
+            return [f"{path}: expected {expected}, got {type(value).__name__}"]
+    if "const" in schema and value != schema["const"]:
+        errors.append(f"{path}: expected {schema['const']!r}, got {value!r}")
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} is not one of {schema['enum']}")
+    if isinstance(value, str) and len(value) < schema.get("minLength", 0):
+        errors.append(f"{path}: must not be empty" if schema["minLength"] == 1
+                      else f"{path}: shorter than {schema['minLength']} characters")
+    if "minimum" in schema and isinstance(value, (int, float)) and value < schema["minimum"]:
+        errors.append(f"{path}: must be >= {schema['minimum']}")
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        for name in schema.get("required", []):
+            if name not in value:
+                errors.append(f"{path}.{name}: required")
+        for name, item in value.items():
+            if name in properties:
+                errors.extend(validate(item, properties[name], f"{path}.{name}"))
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}.{name}: unexpected property")
+    if isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+    if "anyOf" in schema and not any(not validate(value, option, path) for option in schema["anyOf"]):
+        errors.append(f"{path}: matches none of the {len(schema['anyOf'])} allowed shapes")
+    return errors
+
+
+def reply_schema(tools=TOOLS):
+    """Schema for one assistant reply: a tool call with valid arguments, or a plain text answer."""
+    tool_call_shapes = [
+        {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string", "const": tool["function"]["name"]},
+                "arguments": tool["function"]["parameters"],
+            },
+            "required": ["name", "arguments"],
+            "additionalProperties": False,
+        }
+        for tool in tools
+    ]
+    return {
+        "type": "object",
+        "properties": {
+            "tool_call": {"anyOf": tool_call_shapes},
+            "text": {"type": "string"},
+        },
+        "additionalProperties": False,
+        "anyOf": [{"required": ["tool_call"]}, {"required": ["text"]}],
+    }
+
+
+REPLY_SCHEMA = reply_schema()
+
+
+def response_format(schema=REPLY_SCHEMA):
+    """``response_format`` for backends with JSON-Schema constrained decoding (Llama API, OpenAI)."""
+    return {"type": "json_schema", "json_schema": {"name": "assistant_reply", "schema": schema}}
+
+
+def validate_reply(reply, tools=TOOLS):
+    """Errors for a decoded reply. Tool arguments are checked against the named tool's
+    schema directly, so messages point at the bad argument rather than at the anyOf.
+    """
+    if not isinstance(reply, dict):
+        return [f"$: expected object, got {type(reply).__name__}"]
+    errors = [f"$.{key}: unexpected property" for key in reply if key not in ("tool_call", "text")]
+    if "tool_call" not in reply and "text" not in reply:
+        errors.append("$: expected a tool_call or a text field")
+    if "text" in reply:
+        errors.extend(validate(reply["text"], {"type": "string"}, "$.text"))
+    if "tool_call" in reply:
+        tool_call = reply["tool_call"]
+        parameters = {tool["function"]["name"]: tool["function"]["parameters"] for tool in tools}
+        if not isinstance(tool_call, dict):
+            errors.append(f"$.tool_call: expected object, got {type(tool_call).__name__}")
+        elif tool_call.get("name") not in parameters:
+            errors.append(f"$.tool_call.name: unknown tool {tool_call.get('name')!r}")
+        else:
+            errors.extend(validate(tool_call.get("arguments"), parameters[tool_call["name"]],
+                                   "$.tool_call.arguments"))
+    return errors
+
+
+def parse_reply(text, tools=TOOLS):
+    """``(reply, errors)`` for the raw text of a structured-output response."""
+    try:
+        reply = json.loads(text)
+    except json.JSONDecodeError as e:
+        return None, [f"$: invalid JSON ({e})"]
+    return reply, validate_reply(reply, tools)
@@ -0,0 +1,154 @@
+# tracing.py
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "mcp-graph-agent")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = "OK"
+        self.error = None
+        # Every span of a trace shares the root's list, so the finished root holds the whole trace
+        self.trace = parent.trace if parent else []
+        self.trace.append(self)
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, error):
+        self.status = "ERROR"
+        self.error = str(error)
+
+    @property
+    def duration_ms(self):
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.status == "ERROR" else {"code": 1}
+        }
+        if self.parent:
+            span["parentSpanId"] = self.parent.span_id
+        return span
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """Minimal span tracer that writes finished traces as OTLP/JSON lines.
+
+    Each line of ``export_path`` is one ExportTraceServiceRequest, the format
+    read by the OpenTelemetry Collector's ``otlpjsonfile`` receiver.
+    """
+
+    def __init__(self, export_path=TRACE_FILE, service_name=SERVICE_NAME):
+        self.export_path = export_path
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    def start_span(self, name, **attributes):
+        span = Span(name, parent=_current_span.get(), attributes=attributes)
+        span._token = _current_span.set(span)
+        return span
+
+    def end_span(self, span, error=None):
+        if span.end_ns is not None:
+            return span
+        if error is not None:
+            span.set_error(error)
+        span.end_ns = time.time_ns()
+        try:
+            _current_span.reset(span._token)
+        except ValueError:
+            # Ended from a different context than it was started in
+            _current_span.set(span.parent)
+        if span.parent is None:
+            self.export(span.trace)
+        return span
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span = self.start_span(name, **attributes)
+        try:
+            yield span
+        except Exception as e:
+            self.end_span(span, error=e)
+            raise
+        finally:
+            self.end_span(span)
+
+    def current_span(self):
+        return _current_span.get()
+
+    def export(self, spans):
+        if not self.export_path:
+            return
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "tracing"},
+                    "spans": [s.to_otlp() for s in spans if s.end_ns is not None]
+                }]
+            }]
+        }
+        line = json.dumps(request) + "\n"
+        with self._lock:
+            with open(self.export_path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+def format_waterfall(spans, width=40):
+    """Render a finished trace as a fixed-width text waterfall."""
+    if not spans:
+        return ""
+    root = spans[0]
+    total = max(root.duration_ms, 1e-3)
+    depth = {}
+    lines = []
+    for s in sorted(spans, key=lambda s: s.start_ns):
+        depth[s.span_id] = depth.get(s.parent.span_id, -1) + 1 if s.parent else 0
+        offset = (s.start_ns - root.start_ns) / 1e6
+        start_col = int(offset / total * width)
+        bar_len = max(1, int(s.duration_ms / total * width))
+        bar = " " * start_col + "█" * min(bar_len, width - start_col)
+        label = ("  " * depth[s.span_id] + s.name)[:28]
+        flag = " ❌" if s.status == "ERROR" else ""
+        lines.append(f"{label:<28} {offset:>8.0f}ms {bar:<{width}} {s.duration_ms:>8.0f}ms{flag}")
+    return "\n".join(lines)
+
+
+tracer = Tracer()
+span = tracer.span
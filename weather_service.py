@@ -0,0 +1,301 @@
+# weather_service.py
+import os
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+import urllib3
+
+import metrics
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+OPENWEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+OPENWEATHER_GROUP_URL = "https://api.openweathermap.org/data/2.5/group"
+OPENWEATHER_GROUP_MAX_IDS = 20  # the group endpoint's per-request limit
+WEATHER_UNITS = "imperial"
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "600"))    # OpenWeatherMap refreshes roughly every 10 minutes
+WEATHER_STALE_TTL = int(os.getenv("WEATHER_STALE_TTL", "1800"))   # how long past the TTL a stale result may be served
+WEATHER_STALE_WHILE_REVALIDATE = os.getenv("WEATHER_STALE_WHILE_REVALIDATE", "1") == "1"
+WEATHER_CACHE_ENTRIES = 1024
+WEATHER_TIMEOUT = 10
+WEATHER_MAX_PARALLEL = int(os.getenv("WEATHER_MAX_PARALLEL", "10"))  # upstream requests in flight per batch
+
+
+class WeatherError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def normalize_location(location):
+    """Cache key for a free-form location: "Beijing", " beijing " and "BEIJING" all become "beijing".
+
+    Accents are dropped and comma-separated parts are trimmed, so "São Paulo, BR" is "sao paulo,br".
+    """
+    text = unicodedata.normalize("NFKD", str(location or "")).encode("ascii", "ignore").decode("ascii")
+    parts = [re.sub(r"[^a-z0-9 \-]", "", re.sub(r"\s+", " ", part.lower())).strip() for part in text.split(",")]
+    return ",".join(part for part in parts if part)
+
+
+def split_locations(text):
+    """Locations in a phrase like "Beijing, Tokyo and Paris, FR"; a two-letter part is a country code."""
+    locations = []
+    for part in re.split(r"\s*(?:;|,|&|\band\b|\bvs\.?|\bversus\b)\s*", text.strip().rstrip("?.!")):
+        if not part:
+            continue
+        if locations and re.fullmatch(r"[A-Za-z]{2}", part):
+            locations[-1] += f", {part}"
+        else:
+            locations.append(part)
+    return locations
+
+
+def format_weather(data):
+    """The result shape every get_weather implementation returns."""
+    return {
+        "location": f"{data['name']}, {data['sys']['country']}",
+        "temperature": f"{data['main']['temp']} °F",
+        "description": data['weather'][0]['description'].capitalize(),
+        "humidity": f"{data['main']['humidity']}%",
+        "wind_speed": f"{data['wind']['speed']} mph"
+    }
+
+
+class _Entry:
+    __slots__ = ("city_id", "result", "fetched_at")
+
+    def __init__(self, city_id, result, fetched_at):
+        self.city_id = city_id
+        self.result = result
+        self.fetched_at = fetched_at
+
+
+class WeatherService:
+    """Current-weather lookups with a shared cache.
+
+    Results are cached per OpenWeatherMap city id. Every spelling that
+    resolved to a city ("Beijing", "beijing, cn", the returned "Beijing, CN")
+    is kept as an alias of that id, so later lookups under any of them hit
+    the cache. Concurrent lookups of the same location share one upstream
+    request. Past the TTL a result may still be served for WEATHER_STALE_TTL
+    while one background refresh runs.
+    """
+
+    def __init__(self, api_key=None, ttl=WEATHER_CACHE_TTL, stale_ttl=WEATHER_STALE_TTL,
+                 stale_while_revalidate=WEATHER_STALE_WHILE_REVALIDATE, max_entries=WEATHER_CACHE_ENTRIES):
+        self.api_key = api_key or os.getenv("OPENWEATHER_API_KEY")
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.max_entries = max_entries
+        self.session = requests.Session()
+        # Keep one pooled connection per parallel request instead of requests' default of 10
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=WEATHER_MAX_PARALLEL)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=WEATHER_MAX_PARALLEL, thread_name_prefix="weather")
+        self._entries = {}    # city id -> _Entry
+        self._aliases = {}    # normalized location -> city id
+        self._inflight = {}   # normalized location -> Future
+        self._lock = threading.Lock()
+
+    def _fetch(self, location):
+        response = self.session.get(
+            OPENWEATHER_URL,
+            params={"q": location, "appid": self.api_key, "units": WEATHER_UNITS},
+            verify=False,
+            timeout=WEATHER_TIMEOUT
+        )
+        if response.status_code != 200:
+            raise WeatherError(f"HTTP {response.status_code}: {response.text}", status=response.status_code)
+        return response.json()
+
+    def _fetch_group(self, city_ids):
+        """One request for up to OPENWEATHER_GROUP_MAX_IDS cities already known by id."""
+        response = self.session.get(
+            OPENWEATHER_GROUP_URL,
+            params={"id": ",".join(str(c) for c in city_ids), "appid": self.api_key, "units": WEATHER_UNITS},
+            verify=False,
+            timeout=WEATHER_TIMEOUT
+        )
+        if response.status_code != 200:
+            raise WeatherError(f"HTTP {response.status_code}: {response.text}", status=response.status_code)
+        return {data["id"]: self._store(None, data) for data in response.json()["list"]}
+
+    def _store(self, key, data):
+        entry = _Entry(data["id"], format_weather(data), time.monotonic())
+        with self._lock:
+            self._entries[entry.city_id] = entry
+            for alias in (key or normalize_location(data["name"]), normalize_location(data["name"]),
+                          normalize_location(f"{data['name']},{data['sys']['country']}")):
+                self._aliases[alias] = entry.city_id
+            if len(self._entries) > self.max_entries:
+                # Drop the oldest fetches together with their aliases
+                for city_id in sorted(self._entries, key=lambda c: self._entries[c].fetched_at)[
+                        :len(self._entries) - self.max_entries]:
+                    del self._entries[city_id]
+                self._aliases = {a: c for a, c in self._aliases.items() if c in self._entries}
+        return entry
+
+    def _cached(self, key):
+        with self._lock:
+            city_id = self._aliases.get(key)
+            return self._entries.get(city_id) if city_id is not None else None
+
+    def _load(self, key, location):
+        """Fetch ``location`` unless a fetch for ``key`` is already running; returns that fetch's Future."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+        try:
+            future.set_result(self._store(key, self._fetch(location)))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return future, True
+
+    def _revalidate(self, key, location):
+        def refresh():
+            try:
+                self._load(key, location)[0].result()
+            except Exception as e:
+                print(f"[WARNING] Weather refresh for {location!r} failed: {e}")
+        threading.Thread(target=refresh, name="weather-refresh", daemon=True).start()
+
+    def lookup(self, location):
+        """Current weather for ``location``; raises WeatherError when the provider has none."""
+        key = normalize_location(location)
+        if not key:
+            raise WeatherError("A location is required")
+        entry = self._cached(key)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl:
+                metrics.CACHE_REQUESTS.labels(cache="weather", result="hit").inc()
+                return entry.result
+            if self.stale_while_revalidate and age < self.ttl + self.stale_ttl:
+                metrics.CACHE_REQUESTS.labels(cache="weather", result="stale").inc()
+                with self._lock:
+                    refreshing = key in self._inflight
+                if not refreshing:
+                    self._revalidate(key, location)
+                return entry.result
+        future, fetched = self._load(key, location)
+        metrics.CACHE_REQUESTS.labels(cache="weather", result="miss" if fetched else "coalesced").inc()
+        try:
+            return future.result(timeout=WEATHER_TIMEOUT * 2).result
+        except (requests.exceptions.RequestException, KeyError, ValueError, TimeoutError) as e:
+            raise WeatherError(f"Weather lookup for {location!r} failed: {e}") from e
+
+    def _revalidate_group(self, city_ids):
+        try:
+            self._fetch_group(city_ids)
+        except Exception as e:
+            print(f"[WARNING] Weather refresh for city ids {city_ids} failed: {e}")
+
+    def lookup_many(self, locations):
+        """Current weather for several locations at once, in order.
+
+        Each item is {"query": location, **result} or {"query": location, "error": ...}.
+        Fresh cache hits cost nothing, expired cities whose id is known are
+        refreshed through the group endpoint, and the rest are fetched in
+        parallel, so the batch takes about one upstream round trip.
+        """
+        results = {}   # key -> result or WeatherError
+        due = {}       # city id -> [(key, location)] for expired entries
+        unknown = {}   # key -> location never resolved before
+        stale_ids = []
+        seen = set()
+        for location in locations:
+            key = normalize_location(location)
+            if key in seen:
+                continue
+            seen.add(key)
+            if not key:
+                results[key] = WeatherError("A location is required")
+                continue
+            entry = self._cached(key)
+            age = time.monotonic() - entry.fetched_at if entry is not None else None
+            if entry is not None and age < self.ttl:
+                metrics.CACHE_REQUESTS.labels(cache="weather", result="hit").inc()
+                results[key] = entry.result
+            elif entry is not None and self.stale_while_revalidate and age < self.ttl + self.stale_ttl:
+                metrics.CACHE_REQUESTS.labels(cache="weather", result="stale").inc()
+                results[key] = entry.result
+                stale_ids.append(entry.city_id)
+            elif entry is not None:
+                due.setdefault(entry.city_id, []).append((key, location))
+            else:
+                unknown[key] = location
+
+        groups = {}
+        ids = list(due)
+        for i in range(0, len(ids), OPENWEATHER_GROUP_MAX_IDS):
+            chunk = ids[i:i + OPENWEATHER_GROUP_MAX_IDS]
+            groups[self._executor.submit(self._fetch_group, chunk)] = chunk
+        singles = {key: self._executor.submit(self.lookup, location) for key, location in unknown.items()}
+        for future, chunk in groups.items():
+            metrics.CACHE_REQUESTS.labels(cache="weather", result="miss").inc(len(chunk))
+            try:
+                entries = future.result()
+            except Exception as e:
+                # e.g. API plans without the group endpoint; fall back to one request per city
+                print(f"[WARNING] Weather group request failed, fetching cities one by one: {e}")
+                entries = {}
+            for city_id in chunk:
+                for key, location in due[city_id]:
+                    if city_id in entries:
+                        results[key] = entries[city_id].result
+                    else:
+                        singles[key] = self._executor.submit(self.lookup, location)
+        for key, future in singles.items():
+            try:
+                results[key] = future.result()
+            except WeatherError as e:
+                results[key] = e
+        for i in range(0, len(stale_ids), OPENWEATHER_GROUP_MAX_IDS):
+            self._executor.submit(self._revalidate_group, stale_ids[i:i + OPENWEATHER_GROUP_MAX_IDS])
+
+        batch = []
+        for location in locations:
+            result = results[normalize_location(location)]
+            if isinstance(result, WeatherError):
+                batch.append({"query": location, "error": str(result)})
+            else:
+                batch.append({"query": location, **result})
+        return batch
+
+    def get_weather(self, location):
+        """``lookup`` with errors returned as {"error": ...}, the shape the chat tools expect."""
+        try:
+            return self.lookup(location)
+        except WeatherError as e:
+            return {"error": str(e)}
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_weather_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = WeatherService()
+        return _service
+
+
+def get_weather(location):
+    return get_weather_service().get_weather(location)
+
+
+def get_weather_many(locations):
+    return get_weather_service().lookup_many(locations)